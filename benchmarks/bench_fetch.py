@@ -0,0 +1,135 @@
+"""
+Measures the throughput of the refresh pipelines against the local fixture
+server, with and without injected failures (slow responses, timeouts, 429s,
+malformed pages), offline.
+
+    python benchmarks/bench_fetch.py [--teams 40] [--concurrency 4 16]
+
+The asyncio pipeline runs every scenario, the threaded one (update_db) only the
+scenarios without failures, as it falls back to Selenium on a failed request.
+The server runs in its own process, rate limiting is turned off and the cache
+store used is a temporary copy.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+WORK_PATH = tempfile.mkdtemp(prefix="xg_tracker_bench_")
+
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+# pylint:disable=wrong-import-position
+import config  # noqa: E402
+
+config.ARCHIVE_PATH = os.path.join(ROOT, "data_cache", "tables.zip")
+config.CACHE_DB_PATH = os.path.join(WORK_PATH, "xg_tracker.sqlite")
+config.PARSED_CACHE_PATH = os.path.join(WORK_PATH, "parsed")
+config.MEMOIZE = False
+config.REFRESH_RATE = config.REFRESH_BURST = 1e6
+config.HTTP_TIMEOUT = 1
+config.HTTP_BACKOFF = 0.05
+
+import metrics  # noqa: E402
+import scraping  # noqa: E402
+from async_fetch import update_db_async  # noqa: E402
+from cache_store import STORE  # noqa: E402
+from fixture_server import Faults, make_server  # noqa: E402
+
+metrics.LOGGER.setLevel("ERROR")
+
+SCENARIOS = {
+    "clean": Faults(),
+    "slow": Faults(delay=0.2),
+    "timeouts": Faults(timeout_rate=0.05, hang=2),
+    "throttled": Faults(throttle_rate=0.2, retry_after=0.1),
+    "malformed": Faults(malformed_rate=0.1),
+}
+
+
+def serve(port: int, faults: Faults):
+    make_server(port, faults).serve_forever()
+
+
+def start_server_process(faults: Faults) -> multiprocessing.Process:
+    """Serves on a free port, set as config.UNDERSTAT_URL"""
+    with socket.socket() as probe:
+        probe.bind(("localhost", 0))
+        port = probe.getsockname()[1]
+
+    process = multiprocessing.Process(target=serve, args=(port, faults), daemon=True)
+    process.start()
+    while True:  # wait for the server to listen
+        try:
+            socket.create_connection(("localhost", port)).close()
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+
+    config.UNDERSTAT_URL = f"http://localhost:{port}"
+    return process
+
+
+def run_threads(teams: list, year: int, workers: int) -> dict:
+    return scraping.update_db(teams, [year], "team", workers=workers, force=True)
+
+
+def run_async(teams: list, year: int, workers: int) -> dict:
+    return update_db_async(teams, [year], "team", workers=workers, force=True)
+
+
+def get_error_kind(error: str) -> str:
+    if error == "cancelled":
+        return error
+    if "FetchError" in error:
+        return error.rsplit("last: ", 1)[-1].rstrip("')\"")
+    return error.split("(", 1)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--teams", type=int, default=40)
+    parser.add_argument("--year", type=int, default=2019)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    args = parser.parse_args()
+
+    STORE.import_archive()
+    teams = sorted(
+        team for team, year, _ in STORE.versions("matches") if year == args.year
+    )[: args.teams]
+
+    for scenario in args.scenarios:
+        server = start_server_process(SCENARIOS[scenario])
+
+        for workers in args.concurrency:
+            runners = [("async", run_async)]
+            if scenario in ["clean", "slow"]:
+                runners.insert(0, ("threads", run_threads))
+
+            for runner_name, runner in runners:
+                start = time.perf_counter()
+                errors = runner(teams, args.year, workers)
+                seconds = time.perf_counter() - start
+
+                kinds = Counter(get_error_kind(error) for error in errors.values())
+                print(
+                    f"{scenario:>9} | {runner_name:>7} x{workers:<3} | "
+                    f"{len(teams) / seconds:6.1f} pages/s | "
+                    f"{len(teams) - len(errors)}/{len(teams)} saved | "
+                    f"failures {dict(kinds)}",
+                    flush=True,
+                )
+
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Cold-start time of the app: imports its modules in fresh interpreters and
+breaks the time down per imported package (python -X importtime).
+
+    python benchmarks/bench_import.py [--repeat 5]
+
+Also checks that serving pages doesn't load the scraping code (scraping.py,
+Selenium, BeautifulSoup...), which is only imported on a cache miss.
+bench_pipeline.py tracks the total along with the other stages (app_import).
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+# the modules imported by app.py (which can't be imported outside of streamlit)
+APP_MODULES = ["streamlit", "bokeh.plotting", "config", "metrics", "texts"]
+APP_MODULES += ["player_index", "utils"]
+SCRAPING_MODULES = ["scraping", "driver_pool", "selenium", "bs4", "tqdm", "aiohttp"]
+
+
+def measure_imports(modules: list = APP_MODULES):
+    """Imports `modules` in a fresh interpreter, returns the total time in ms,
+    {module: cumulative ms} and the scraping modules that were loaded. Each
+    module only counts what the previous ones didn't import already"""
+    check = f"import sys; print([m for m in {SCRAPING_MODULES} if m in sys.modules])"
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {', '.join(modules)}; {check}",
+        ],
+        cwd=SRC_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    imports = dict()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() in modules:
+            imports[name.strip()] = int(cumulative) / 1000
+
+    return sum(imports.values()), imports, ast.literal_eval(process.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    totals, imports = [], defaultdict(list)
+    for _ in range(args.repeat):
+        total, run_imports, scraping_modules = measure_imports()
+        totals.append(total)
+        for name, milliseconds in run_imports.items():
+            imports[name].append(milliseconds)
+
+    print(f"app imports: {statistics.median(totals):.0f} ms (median of {args.repeat})")
+    medians = {name: statistics.median(times) for name, times in imports.items()}
+    for name, milliseconds in sorted(medians.items(), key=lambda item: -item[1]):
+        print(f"{name:>16} {milliseconds:8.1f} ms")
+
+    print(f"scraping modules loaded: {', '.join(scraping_modules) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
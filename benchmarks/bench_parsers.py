@@ -0,0 +1,116 @@
+"""
+Compares the lxml parsers with the former pd.read_html and BeautifulSoup
+parsing, on the players, league and matches tables of data_cache/tables.zip.
+
+    python benchmarks/bench_parsers.py [--repeat 3]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import zipfile
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# pylint:disable=wrong-import-position
+from parsers import parse_calendar, parse_understat_table  # noqa: E402
+
+ARCHIVE_PATH = os.path.join(os.path.dirname(__file__), "..", "data_cache", "tables.zip")
+
+
+def read_html_players(html_table: str) -> pd.DataFrame:
+    """Parsing done by process_html before the lxml parser"""
+    df_team = pd.read_html(html_table)[0]
+    for col in ["xG", "xA"]:
+        df_team[col] = df_team[col].str.split(r"\+|\-").apply(lambda x: float(x[0]))
+
+    return df_team
+
+
+def read_html_league(html_league_table: str) -> pd.DataFrame:
+    """Parsing done by process_html_league before the lxml parser"""
+    df_league = pd.read_html(html_league_table)[0]
+    for col in ["xG", "xGA", "xPTS"]:
+        df_league[col] = df_league[col].str.split("[+-]", expand=True)[0].astype(float)
+
+    return df_league
+
+
+def read_calendar_soup(table_html: str) -> pd.DataFrame:
+    """Parsing done by make_matches_df_from_html before the lxml parser"""
+    match_info = dict()
+    for j, match in enumerate(
+        BeautifulSoup(table_html, "lxml").find_all(
+            "div", {"class": "calendar-date-container mini"}
+        )
+    ):
+        date = match.find("div", {"class": "calendar-date"})
+        x_goals = match.find("div", {"class": "teams-xG"})
+        if x_goals is None:  # match not played yet
+            continue
+        home_xg, away_xg = (
+            float(re.sub("<.*?>", "", str(span))) for span in x_goals.find_all("span")
+        )
+        match_info[j] = {
+            "date": date.text,
+            "opponent": match.find("div", {"class": "team-title"}).text,
+            "team_side": date["data-side"],
+            "match_result": date["data-result"],
+            "home_xGoals": home_xg,
+            "away_xGoals": away_xg,
+        }
+
+    return pd.DataFrame.from_dict(match_info).T
+
+
+def time_parser(parser, tables: list, repeat: int) -> float:
+    """Best total time over `repeat` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for table_html in tables:
+            parser(table_html)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def load_tables(stats: str) -> list:
+    tables = []
+    with zipfile.ZipFile(ARCHIVE_PATH) as archive:
+        for member in sorted(archive.namelist()):
+            if not member.endswith(f"_{stats}.txt"):
+                continue
+            table_html = archive.read(member).decode("utf-8").replace("\n", "")
+            if "<table" in table_html or "calendar" in table_html:  # failed scrapes
+                tables.append(table_html)
+
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for stats, legacy_parser, fast_parser in [
+        ("players", read_html_players, parse_understat_table),
+        ("league", read_html_league, parse_understat_table),
+        ("matches", read_calendar_soup, parse_calendar),
+    ]:
+        tables = load_tables(stats)
+        legacy = time_parser(legacy_parser, tables, args.repeat)
+        fast = time_parser(fast_parser, tables, args.repeat)
+
+        print(
+            f"{stats:>8}: {len(tables)} tables | {legacy_parser.__name__} {legacy:.2f}s | "
+            f"lxml {fast:.2f}s | x{legacy / fast:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
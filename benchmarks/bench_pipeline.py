@@ -0,0 +1,420 @@
+"""
+Times and memory-profiles every stage of the app, offline, on the data_cache
+files, and compares the results with a previous run.
+
+    python benchmarks/bench_pipeline.py [--repeat 3] [--teams 12]
+
+Each run is appended to benchmarks/results.jsonl along with its git commit, and
+compared with the last run of another commit: a stage slower than --threshold
+is reported as a regression. The cache store used is a temporary copy, and
+memoization is turned off so that every stage does its whole work.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results.jsonl")
+WORK_PATH = tempfile.mkdtemp(prefix="xg_tracker_bench_")
+
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+# pylint:disable=wrong-import-position
+import config  # noqa: E402
+
+config.ARCHIVE_PATH = os.path.join(ROOT, "data_cache", "tables.zip")
+config.CACHE_DB_PATH = os.path.join(WORK_PATH, "xg_tracker.sqlite")
+config.PARSED_CACHE_PATH = os.path.join(WORK_PATH, "parsed")
+config.MEMOIZE = False
+
+import pandas as pd  # noqa: E402
+
+import parsed_cache  # noqa: E402
+import scraping  # noqa: E402
+import utils  # noqa: E402
+from bench_import import APP_MODULES, SRC_PATH  # noqa: E402
+from cache_store import STORE  # noqa: E402
+from parsers import parse_calendar  # noqa: E402
+
+
+def render_team_page(team: str, year: int):
+    """The team page of app.py, with the default options of the sidebar"""
+    utils.show_cached_chart(
+        ("matches", team, year, True, False, config.DEFAULT_ROLLING_WINDOW, None),
+        sources=[(team, year, "matches")],
+        build_chart=lambda: utils.plot_xG_team_df(
+            utils.get_processed_table(team, year, stats="matches"),
+            team_name=team,
+            year=year,
+            rolling_xG=True,
+            rolling_xGA=False,
+        ),
+    )
+    for mode in ["G", "A"]:
+        utils.show_cached_chart(
+            ("players", team, year, mode),
+            sources=[(team, year, "players")],
+            build_chart=lambda mode=mode: utils.plot_xG_df(
+                utils.get_processed_table(team, year, stats="players"),
+                team_name=team,
+                year=year,
+                mode=mode,
+            ),
+        )
+    utils.make_croqueurs_killers(utils.get_processed_table(team, year, stats="players"))
+    for kind, make_chart in [
+        ("situations", utils.make_situation_chart),
+        ("shots_quality", utils.make_quality_shot_chart),
+    ]:
+        utils.show_cached_chart(
+            (kind, team, year),
+            sources=[(team, year, "statistics")],
+            build_chart=lambda make_chart=make_chart: make_chart(
+                utils.get_processed_table(team, year, stats="statistics"), team, year
+            ),
+        )
+
+
+def render_league_page(league: str, year: int):
+    """The league page of app.py"""
+    for mode in ["G", "PTS", "GA"]:
+        utils.show_cached_chart(
+            ("league", league, year, mode),
+            sources=[(league, year, "league")],
+            build_chart=lambda mode=mode: utils.plot_xG_league(
+                utils.get_processed_table(league, year, stats="league"),
+                league_name=league,
+                year=year,
+                mode=mode,
+            ),
+        )
+
+
+def invalidate_league(league: str, year: int):
+    parsed_cache.delete_parsed(f"{league}_{year}_league")
+    STORE.delete_charts(league, year)
+
+
+def get_fixtures(n_teams: int):
+    """A fixed sample of `n_teams` team seasons with their three tables,
+    and all the league seasons"""
+    STORE.import_archive()
+
+    def is_valid(name, year, stats):
+        return "None" != STORE.read(name, year, stats)
+
+    team_seasons = sorted(
+        (team, year)
+        for team, year, _ in STORE.versions("matches")
+        if all(is_valid(team, year, stats) for stats in utils.TEAM_STATS)
+    )
+    team_seasons = team_seasons[:: max(len(team_seasons) // n_teams, 1)][:n_teams]
+    league_seasons = sorted(
+        (league, year)
+        for league, year, _ in STORE.versions("league")
+        if is_valid(league, year, "league")
+    )
+
+    return team_seasons, league_seasons
+
+
+def make_stages(team_seasons: list, league_seasons: list) -> dict:
+    """{stage: [(setup, run)]}, only `run` being measured"""
+    read = STORE.read
+    players = [read(team, year, "players") for team, year in team_seasons]
+    stats = [read(team, year, "statistics") for team, year in team_seasons]
+    calendars = [read(team, year, "matches") for team, year in team_seasons]
+    leagues = [read(league, year, "league") for league, year in league_seasons]
+
+    # inputs of the transformation and chart stages
+    df_players = [utils.process_html(html) for html in players]
+    df_stats = [utils.process_html(html, mode="GA") for html in stats]
+    df_calendars = [pd.DataFrame(parse_calendar(html).played) for html in calendars]
+    df_matches = [utils.make_matches_df_from_html(html) for html in calendars]
+    df_leagues = [utils.process_html_league(html) for html in leagues]
+    teams = sorted({team for team, _ in team_seasons})
+    df_seasons = [utils.get_team_seasons(team, config.LIST_OF_YEARS) for team in teams]
+
+    runs = {
+        "cache_read": [
+            partial(read, name, year, kind)
+            for name, year, kind in [
+                *((t, y, s) for t, y in team_seasons for s in utils.TEAM_STATS),
+                *((league, y, "league") for league, y in league_seasons),
+            ]
+        ],
+        "process_html": [partial(utils.process_html, html) for html in players],
+        "process_html_GA": [
+            partial(utils.process_html, html, mode="GA") for html in stats
+        ],
+        "process_html_league": [
+            partial(utils.process_html_league, html) for html in leagues
+        ],
+        "make_matches_df_from_html": [
+            partial(utils.make_matches_df_from_html, html) for html in calendars
+        ],
+        # process_df_teams modifies its input: it runs on a copy
+        "process_df_teams": [
+            partial(lambda df: utils.process_df_teams(df.copy()), df)
+            for df in df_calendars
+        ],
+        "make_seasons_df": [
+            partial(
+                utils.make_seasons_df,
+                STORE.read_seasons(team, config.LIST_OF_YEARS, "matches"),
+            )
+            for team in teams
+        ],
+        "make_croqueurs_killers": [
+            partial(utils.make_croqueurs_killers, df) for df in df_players
+        ],
+    }
+    for mode in ["G", "A"]:
+        runs[f"plot_xG_df_{mode}"] = [
+            partial(utils.plot_xG_df, df, team, year, mode=mode)
+            for df, (team, year) in zip(df_players, team_seasons)
+        ]
+    for make_chart in [utils.make_situation_chart, utils.make_quality_shot_chart]:
+        runs[make_chart.__name__] = [
+            partial(make_chart, df, team, year)
+            for df, (team, year) in zip(df_stats, team_seasons)
+        ]
+    for mode in ["G", "PTS", "GA"]:
+        runs[f"plot_xG_league_{mode}"] = [
+            partial(utils.plot_xG_league, df, league, year, mode=mode)
+            for df, (league, year) in zip(df_leagues, league_seasons)
+        ]
+    runs["plot_xG_team_df"] = [
+        partial(
+            utils.plot_xG_team_df, df, team, year, rolling_xG=True, rolling_xGA=True
+        )
+        for df, (team, year) in zip(df_matches, team_seasons)
+    ]
+    runs["plot_team_trajectory"] = [
+        partial(utils.plot_team_trajectory, df, team)
+        for df, team in zip(df_seasons, teams)
+    ]
+    # the Europe view: all the league seasons in one table
+    europe_tables = {
+        (league, year): html
+        for (league, year), html in zip(league_seasons, leagues)
+        if league in config.COUNTRY_LEAGUES.values()
+    }
+    df_europe = utils.make_europe_df(europe_tables)
+    runs["make_europe_df"] = [partial(utils.make_europe_df, europe_tables)]
+    runs["europe_table_warm"] = [utils.get_europe_table]
+    runs["plot_xG_europe"] = [
+        partial(utils.plot_xG_europe, df_europe, mode=mode)
+        for mode in ["G", "PTS", "GA"]
+    ]
+
+    stages = {
+        name: [(None, run) for run in stage_runs] for name, stage_runs in runs.items()
+    }
+
+    # whole pages: cold (tables parsed, charts built and serialized) or warm
+    # (a new session, served by the parsed tier and the chart cache)
+    stages["team_page_cold"] = [
+        (
+            partial(scraping.invalidate_team, team, year),
+            partial(render_team_page, team, year),
+        )
+        for team, year in team_seasons
+    ]
+    stages["team_page_warm"] = [
+        (None, partial(render_team_page, team, year)) for team, year in team_seasons
+    ]
+    stages["league_page_cold"] = [
+        (
+            partial(invalidate_league, league, year),
+            partial(render_league_page, league, year),
+        )
+        for league, year in league_seasons
+    ]
+    stages["league_page_warm"] = [
+        (None, partial(render_league_page, league, year))
+        for league, year in league_seasons
+    ]
+    # cold start: a fresh interpreter importing the modules of app.py
+    stages["app_import"] = [
+        (
+            None,
+            partial(
+                subprocess.run,
+                [sys.executable, "-c", f"import {', '.join(APP_MODULES)}"],
+                cwd=SRC_PATH,
+                check=True,
+            ),
+        )
+    ]
+
+    return stages
+
+
+def run_stage(calls: list, repeat: int) -> dict:
+    """Time per call (median and best of `repeat` runs, after a warm-up run
+    that also fills the caches of the warm pages) and peak memory of a call,
+    measured in a separate run since tracemalloc slows everything down"""
+    for setup, run in calls:
+        if setup is not None:
+            setup()
+        run()
+
+    timings = []
+    for _ in range(repeat):
+        total = 0.0
+        for setup, run in calls:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            run()
+            total += time.perf_counter() - start
+        timings.append(total / len(calls))
+
+    peak = 0
+    for setup, run in calls:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        run()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "calls": len(calls),
+        "time_ms": round(statistics.median(timings) * 1000, 3),
+        "best_ms": round(min(timings) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def get_commit() -> dict:
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        return {
+            "commit": git("rev-parse", "--short", "HEAD"),
+            "dirty": bool(git("status", "--porcelain", "--", "src", "benchmarks")),
+        }
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": True}
+
+
+def load_baseline(results_path: str, commit: str, baseline: str = None):
+    """The last run of `baseline`, or of any commit other than `commit`,
+    or else the last run"""
+    if not os.path.exists(results_path):
+        return None
+
+    with open(results_path) as results_file:
+        runs = [json.loads(line) for line in results_file if line.strip()]
+
+    if baseline is not None:
+        candidates = [run for run in runs if run["commit"] == baseline]
+    else:
+        candidates = [run for run in runs if run["commit"] != commit] or runs
+
+    return candidates[-1] if candidates else None
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """Prints the stages side by side, returns the regressed ones"""
+    if baseline is not None:
+        print(f"compared with {baseline['commit']} ({baseline['date']})")
+
+    regressions = []
+    print(f"{'stage':<28}{'ms/call':>10}{'before':>10}{'delta':>9}{'peak kB':>10}")
+    for name, stage in result["stages"].items():
+        before = (baseline or dict()).get("stages", dict()).get(name)
+        if before is None:
+            print(
+                f"{name:<28}{stage['time_ms']:>10.2f}{'-':>10}{'-':>9}"
+                f"{stage['peak_kb']:>10.0f}"
+            )
+            continue
+
+        delta = stage["time_ms"] / before["time_ms"] - 1 if before["time_ms"] else 0
+        print(
+            f"{name:<28}{stage['time_ms']:>10.2f}{before['time_ms']:>10.2f}"
+            f"{delta:>+9.0%}{stage['peak_kb']:>10.0f}"
+            + ("  REGRESSION" if delta > threshold else "")
+        )
+        if delta > threshold:
+            regressions.append(name)
+
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--teams", type=int, default=12, help="number of team seasons to sample"
+    )
+    parser.add_argument(
+        "--stages", nargs="+", help="only run these stages (default: all)"
+    )
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument(
+        "--baseline", help="commit to compare with (default: the last other one)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown reported as a regression",
+    )
+    parser.add_argument(
+        "--fail-on-regression", action="store_true", help="exit with 1 on regressions"
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    try:
+        team_seasons, league_seasons = get_fixtures(args.teams)
+        stages = make_stages(team_seasons, league_seasons)
+
+        result = {
+            **get_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "fixtures": {"teams": len(team_seasons), "leagues": len(league_seasons)},
+            "repeat": args.repeat,
+            "stages": dict(),
+        }
+        for name, calls in stages.items():
+            if args.stages is None or name in args.stages:
+                result["stages"][name] = run_stage(calls, args.repeat)
+    finally:
+        shutil.rmtree(WORK_PATH, ignore_errors=True)
+
+    baseline = load_baseline(args.results, result["commit"], args.baseline)
+    regressions = compare(result, baseline, args.threshold)
+
+    with open(args.results, "a") as results_file:
+        results_file.write(json.dumps(result) + "\n")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,18 @@
 This file builds the skeleton of the app and the graphs to display.
 """
 # pylint:disable=no-member
+import time
 
 import streamlit as st
 from bokeh.plotting import show
 
 import config
+import metrics
 import texts
+from player_index import get_player_career, query_players, search_players
 from utils import *
 
-if config.UPDATE_DB:
-    for national_teams in config.COUNTRY_TEAMS.values():
-        update_db(national_teams[1:], [config.UPDATE_YEAR], stats="players")
-        update_db(national_teams[1:], [config.UPDATE_YEAR], stats="statistics")
-        update_db(national_teams[1:], [config.UPDATE_YEAR], stats="matches")
-    update_db(config.COUNTRY_LEAGUES.values(), [
-              config.UPDATE_YEAR], stats="league")
-
+page_start = time.perf_counter()
 
 st.set_page_config(page_title="xG Tracker", layout="wide",
                    initial_sidebar_state="auto")
@@ -31,13 +27,14 @@ st.text("")
 
 parameters, analysis = make_sidebar()
 
-country_choice, team_choice, year_choice, team_mode = parameters
+country_choice, team_choice, year_choice, team_mode, player_query = parameters
 (
     goal_options,
     assist_options,
     situations_options,
     shots_quality_options,
     top_players_options,
+    trajectory_options,
 ) = analysis
 
 if team_mode == "Par ligue":
@@ -46,11 +43,6 @@ if team_mode == "Par ligue":
         explanation_txt.empty()
 
         league_name = config.COUNTRY_LEAGUES[country_choice]
-        html_league_table = get_xG_html_table(
-            league_name, year=year_choice, stats="league"
-        )
-        df_league = process_html_league(html_league_table)
-
         # Goals per league
         st.header(
             f"Goals vs xGoals en {league_name}, saison {year_choice}-{year_choice + 1}"
@@ -62,12 +54,17 @@ if team_mode == "Par ligue":
         if meaning_league_xg_graph:
             st.markdown(texts.MEANING_LEAGUE_XG_GRAPH)
 
-        league_plot_G = plot_xG_league(
-            df_league, league_name=league_name, year=year_choice, mode="G"
+        show_cached_chart(
+            ("league", league_name, year_choice, "G"),
+            sources=[(league_name, year_choice, "league")],
+            build_chart=lambda: plot_xG_league(
+                get_processed_table(league_name, year_choice, stats="league"),
+                league_name=league_name,
+                year=year_choice,
+                mode="G",
+            ),
         )
 
-        st.bokeh_chart(league_plot_G)
-
         # Points per league
         st.header(
             f"Points vs xPoints en {league_name}, saison {year_choice}-{year_choice + 1}"
@@ -79,12 +76,17 @@ if team_mode == "Par ligue":
         if meaning_league_xpts_graph:
             st.markdown(texts.MEANING_LEAGUE_XPTS_GRAPH)
 
-        league_plot_PTS = plot_xG_league(
-            df_league, league_name=league_name, year=year_choice, mode="PTS"
+        show_cached_chart(
+            ("league", league_name, year_choice, "PTS"),
+            sources=[(league_name, year_choice, "league")],
+            build_chart=lambda: plot_xG_league(
+                get_processed_table(league_name, year_choice, stats="league"),
+                league_name=league_name,
+                year=year_choice,
+                mode="PTS",
+            ),
         )
 
-        st.bokeh_chart(league_plot_PTS)
-
         # Goal Against per league
         st.header(
             f"Goal Against (GA) vs xGoal Against (xGA) en {league_name},"
@@ -97,12 +99,17 @@ if team_mode == "Par ligue":
         if meaning_league_xGA_graph:
             st.markdown(texts.MEANING_LEAGUE_XGA_GRAPH)
 
-        league_plot_GA = plot_xG_league(
-            df_league, league_name=league_name, year=year_choice, mode="GA"
+        show_cached_chart(
+            ("league", league_name, year_choice, "GA"),
+            sources=[(league_name, year_choice, "league")],
+            build_chart=lambda: plot_xG_league(
+                get_processed_table(league_name, year_choice, stats="league"),
+                league_name=league_name,
+                year=year_choice,
+                mode="GA",
+            ),
         )
 
-        st.bokeh_chart(league_plot_GA)
-
 elif team_mode == "Par équipe":
     if (team_choice != "<Choix d'une équipe>") & (
         country_choice != "<Choix d'un pays>"
@@ -112,10 +119,6 @@ elif team_mode == "Par équipe":
 
         st.header("xGoals sur la saison")
 
-        table_html = get_xG_html_table(
-            team_choice, year=year_choice, stats="matches")
-        df_matches = make_matches_df_from_html(table_html)
-
         left, right = st.beta_columns(2)
         with left:
             rolling_xG = st.checkbox(
@@ -124,37 +127,47 @@ elif team_mode == "Par équipe":
             rolling_xGA = st.checkbox(
                 "Afficher la moyenne glissante de xG concédés")
 
-        matches_plot = plot_xG_team_df(
-            df_matches,
-            team_name=team_choice,
-            year=year_choice,
-            rolling_xG=rolling_xG,
-            rolling_xGA=rolling_xGA,
-        )
-
-        html_team_table = get_xG_html_table(team_choice, year=year_choice)
-        df_team = process_html(html_team_table)
-
-        goal_plot = plot_xG_df(
-            df_team, team_name=team_choice, year=year_choice, mode="G"
-        )
-        assist_plot = plot_xG_df(
-            df_team, team_name=team_choice, year=year_choice, mode="A"
-        )
-
-        html_stats_table = get_xG_html_table(
-            team_choice, year=year_choice, stats="statistics"
-        )
-        df_stats_team = process_html(html_stats_table, mode="GA")
+        # every window is in the parsed calendar: changing them reads nothing
+        left, right = st.beta_columns(2)
+        with left:
+            windows = st.multiselect(
+                "Fenêtres glissantes (en matchs)",
+                config.ROLLING_WINDOWS,
+                default=[config.DEFAULT_ROLLING_WINDOW],
+            )
+        with right:
+            halflife = st.selectbox(
+                "Moyenne exponentielle (demi-vie en matchs)",
+                [None, *config.EWMA_HALF_LIVES],
+                format_func=lambda halflife: (
+                    f"{halflife} matchs" if halflife else "Aucune"
+                ),
+            )
 
-        situation_chart = make_situation_chart(
-            df_stats_team, team_choice, year_choice)
-        quality_shot_char = make_quality_shot_chart(
-            df_stats_team, team_choice, year_choice
+        show_cached_chart(
+            (
+                "matches",
+                team_choice,
+                year_choice,
+                rolling_xG,
+                rolling_xGA,
+                *sorted(windows),
+                halflife,
+            ),
+            sources=[(team_choice, year_choice, "matches")],
+            build_chart=lambda: plot_xG_team_df(
+                get_processed_table(team_choice, year_choice, stats="matches"),
+                team_name=team_choice,
+                year=year_choice,
+                rolling_xG=rolling_xG,
+                rolling_xGA=rolling_xGA,
+                windows=sorted(windows),
+                halflife=halflife,
+            ),
         )
 
-        st.bokeh_chart(matches_plot)
-
+        # each section below fetches and builds only what it displays: the
+        # tables are memoized, so a table shared by sections is loaded once
         if goal_options:
             st.header("Goals vs xGoals")
 
@@ -164,7 +177,17 @@ elif team_mode == "Par équipe":
             if meaning_xg_graph:
                 st.markdown(texts.MEANING_XG_GRAPH)
 
-            st.bokeh_chart(goal_plot)
+            show_cached_chart(
+                ("players", team_choice, year_choice, "G"),
+                sources=[(team_choice, year_choice, "players")],
+                build_chart=lambda: plot_xG_df(
+                    get_processed_table(
+                        team_choice, year_choice, stats="players"),
+                    team_name=team_choice,
+                    year=year_choice,
+                    mode="G",
+                ),
+            )
 
         if assist_options:
             st.header("Assists vs xAssists")
@@ -175,9 +198,21 @@ elif team_mode == "Par équipe":
             if meaning_xa_graph:
                 st.markdown(texts.MEANING_XA_GRAPH)
 
-            st.bokeh_chart(assist_plot)
+            show_cached_chart(
+                ("players", team_choice, year_choice, "A"),
+                sources=[(team_choice, year_choice, "players")],
+                build_chart=lambda: plot_xG_df(
+                    get_processed_table(
+                        team_choice, year_choice, stats="players"),
+                    team_name=team_choice,
+                    year=year_choice,
+                    mode="A",
+                ),
+            )
 
         if top_players_options:
+            df_team = get_processed_table(
+                team_choice, year_choice, stats="players")
             df_killers, df_croqueurs = make_croqueurs_killers(df_team)
 
             st.header("Top 3 killers")
@@ -195,7 +230,16 @@ elif team_mode == "Par équipe":
             if meaning_diff_situations:
                 st.markdown(texts.MEANING_DIFF_SITUATIONS)
 
-            st.bokeh_chart(situation_chart)
+            show_cached_chart(
+                ("situations", team_choice, year_choice),
+                sources=[(team_choice, year_choice, "statistics")],
+                build_chart=lambda: make_situation_chart(
+                    get_processed_table(
+                        team_choice, year_choice, stats="statistics"),
+                    team_choice,
+                    year_choice,
+                ),
+            )
 
         if shots_quality_options:
             st.header("Qualité des tirs pour et contre")
@@ -206,9 +250,188 @@ elif team_mode == "Par équipe":
             if meaning_diff_shots:
                 st.markdown(texts.MEANING_DIFF_SHOTS)
 
-            st.bokeh_chart(quality_shot_char)
+            show_cached_chart(
+                ("shots_quality", team_choice, year_choice),
+                sources=[(team_choice, year_choice, "statistics")],
+                build_chart=lambda: make_quality_shot_chart(
+                    get_processed_table(
+                        team_choice, year_choice, stats="statistics"),
+                    team_choice,
+                    year_choice,
+                ),
+            )
+
+        if trajectory_options:
+            st.header("Trajectoire sur toutes les saisons")
+
+            meaning_trajectory = st.checkbox(
+                "Que représente ce graph ?", key="trajectory_graph"
+            )
+            if meaning_trajectory:
+                st.markdown(texts.MEANING_TRAJECTORY)
+
+            # all the cached calendars of the team, loaded and processed at once
+            df_seasons = get_team_seasons(team_choice, config.LIST_OF_YEARS)
+            if df_seasons.empty:
+                st.warning(texts.NO_CACHED_SEASON)
+            else:
+                show_cached_chart(
+                    ("trajectory", team_choice),
+                    sources=[
+                        (team_choice, year, "matches") for year in config.LIST_OF_YEARS
+                    ],
+                    build_chart=lambda: plot_team_trajectory(
+                        df_seasons, team_choice),
+                )
+
+elif team_mode == "Classement des joueurs":
+    intro_txt.empty()
+    explanation_txt.empty()
+
+    league_name = config.COUNTRY_LEAGUES.get(country_choice)  # None: all leagues
+    st.header(f"Classement des joueurs, {league_name or 'tous championnats'}")
+
+    meaning_player_ranking = st.checkbox(
+        "Que représente ce classement ?", key="player_ranking"
+    )
+    if meaning_player_ranking:
+        st.markdown(texts.MEANING_PLAYER_RANKING)
+
+    left, middle, right = st.beta_columns(3)
+    with left:
+        metric = st.selectbox(
+            "Classer par",
+            list(config.PLAYER_METRICS),
+            format_func=config.PLAYER_METRICS.get,
+        )
+        ascending = st.checkbox("Ordre croissant")
+    with middle:
+        first_year, last_year = st.slider(
+            "Saisons",
+            min(config.LIST_OF_YEARS),
+            max(config.LIST_OF_YEARS),
+            value=(year_choice, year_choice),
+        )
+    with right:
+        min_minutes = st.number_input(
+            "Minutes jouées (min.)", min_value=0, value=0, step=90)
+        n_players = st.slider("Nombre de joueurs", 10, 100, 20, step=10)
+
+    # an indexed query on the player index, no table is parsed here
+    df_players = query_players(
+        league=league_name,
+        years=(first_year, last_year),
+        min_values={"minutes": min_minutes},
+        order_by=metric,
+        ascending=ascending,
+        limit=n_players,
+    )
+    if df_players.empty:
+        st.warning(texts.EMPTY_PLAYER_INDEX)
+    else:
+        st.dataframe(df_players)
+
+elif team_mode == "Carrière d'un joueur":
+    intro_txt.empty()
+    explanation_txt.empty()
+
+    st.header("Carrière d'un joueur")
+
+    # a lookup in the name index: no table is parsed until a player is chosen
+    matches = search_players(player_query) if player_query else []
+    if not player_query:
+        st.info(texts.PLAYER_SEARCH_HINT)
+    elif not matches:
+        st.warning(texts.NO_PLAYER_FOUND)
+    else:
+        # (player, seasons, first year, last year, teams), the most played first
+        player = st.selectbox(
+            f"{len(matches)} joueur(s) trouvé(s)",
+            matches,
+            format_func=lambda match: f"{match[0]} ({match[4].replace('_', ' ')}, "
+            f"{match[2]}-{match[3] + 1})",
+        )[0]
+
+        df_career = get_player_career(player)
+        st.dataframe(df_career)
+
+        meaning_player_career = st.checkbox(
+            "Que représente ce graph ?", key="player_career_graph"
+        )
+        if meaning_player_career:
+            st.markdown(texts.MEANING_PLAYER_CAREER)
+
+        show_cached_chart(
+            ("career", player),
+            sources=[
+                (team, year, "players")
+                for team, year in zip(df_career["team"], df_career["year"])
+            ],
+            build_chart=lambda: plot_player_career(df_career, player),
+        )
+
+elif team_mode == "Europe":
+    intro_txt.empty()
+    explanation_txt.empty()
+
+    st.header("Toutes les ligues, toutes les saisons")
+
+    meaning_europe_graph = st.checkbox(
+        "Que représente ce graph ?", key="europe_graph"
+    )
+    if meaning_europe_graph:
+        st.markdown(texts.MEANING_EUROPE_GRAPH)
+
+    left, middle, right = st.beta_columns(3)
+    with left:
+        europe_mode = st.selectbox(
+            "Comparer",
+            ["G", "PTS", "GA"],
+            format_func={
+                "G": "Buts vs xGoals",
+                "PTS": "Points vs xPoints",
+                "GA": "Buts concédés vs xGA",
+            }.get,
+        )
+    with middle:
+        leagues = st.multiselect(
+            "Ligues",
+            list(config.COUNTRY_LEAGUES.values()),
+            default=list(config.COUNTRY_LEAGUES.values()),
+        )
+    with right:
+        first_year, last_year = st.slider(
+            "Saisons",
+            min(config.LIST_OF_YEARS),
+            max(config.LIST_OF_YEARS),
+            value=(min(config.LIST_OF_YEARS), max(config.LIST_OF_YEARS)),
+        )
+
+    # one prebuilt table of all the team seasons, filtered here
+    df_europe = get_europe_table(config.LIST_OF_YEARS)
+    df_europe = df_europe[
+        df_europe["league"].isin(leagues)
+        & df_europe["year"].between(first_year, last_year)
+    ]
+    if df_europe.empty:
+        st.warning(texts.NO_CACHED_LEAGUE)
+    else:
+        show_cached_chart(
+            ("europe", europe_mode, *sorted(leagues), first_year, last_year),
+            sources=[
+                (league, year, "league")
+                for league in sorted(leagues)
+                for year in range(first_year, last_year + 1)
+            ],
+            build_chart=lambda: plot_xG_europe(df_europe, mode=europe_mode),
+        )
 
 st.text("")
 st.info("Source / credits: https://understat.com/")
 
 st.markdown(config.HIDE_FOOTER, unsafe_allow_html=True)
+
+# one span per rerun of the script, i.e. per page displayed
+metrics.observe("page", time.perf_counter() - page_start, mode=team_mode)
+# written every config.METRICS_WRITE_INTERVAL seconds, not on every rerun
+metrics.write_metrics("app", min_interval=config.METRICS_WRITE_INTERVAL)
@@ -0,0 +1,187 @@
+"""
+Asyncio refresh pipeline: the understat pages are fetched by the tasks of one
+event loop, at most `concurrency` at a time and config.REFRESH_RATE per second,
+and written to the cache store the same way update_db does.
+
+Only the http backend is used: a page whose blobs can't be read is reported as
+failed, and left to the threaded refresh (which falls back to Selenium).
+Throttled (429), failing (5xx) and timed out requests are retried
+config.HTTP_RETRIES times with an exponential backoff.
+"""
+import asyncio
+import itertools
+import logging
+from functools import partial
+from typing import List, Tuple
+
+import aiohttp
+from tqdm import tqdm
+
+import config
+import metrics
+import understat_json
+from cache_store import STORE, TEAM_STATS
+from rate_limiter import AsyncTokenBucket
+from scraping import get_page_url, save_tables
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """A page still failing after config.HTTP_RETRIES retries"""
+
+
+def get_retry_delay(attempt: int, retry_after: str = None) -> float:
+    """Seconds to wait before retrying: the Retry-After header of the
+    response if any, an exponential backoff otherwise"""
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):  # missing, or given as a date
+        return config.HTTP_BACKOFF * 2 ** attempt
+
+
+async def fetch_page(
+    session: aiohttp.ClientSession, bucket: AsyncTokenBucket, url: str, mode: str
+) -> str:
+    for attempt in range(config.HTTP_RETRIES + 1):
+        with metrics.span("rate_limit_wait"):
+            await bucket.acquire()
+
+        try:
+            with metrics.span("fetch", backend="async", mode=mode):
+                async with session.get(url) as response:
+                    if response.status not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return await response.text(encoding="utf-8")
+                    reason = str(response.status)
+                    delay = get_retry_delay(
+                        attempt, response.headers.get("Retry-After")
+                    )
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as error:
+            reason = type(error).__name__
+            delay = get_retry_delay(attempt)
+
+        if attempt == config.HTTP_RETRIES:
+            raise FetchError(f"{url} failed {attempt + 1} times, last: {reason}")
+        metrics.increment("fetch_retries", reason=reason)
+        await asyncio.sleep(delay)
+
+
+async def refresh_entry(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    bucket: AsyncTokenBucket,
+    mode: str,
+    name: str,
+    year: int,
+    delta: bool,
+    force: bool,
+) -> bool:
+    """Returns False if the entry was skipped, being still fresh"""
+    # sqlite reads, parsing and writing block: they run in threads, the loop
+    # keeps fetching
+    loop = asyncio.get_running_loop()
+    if not force and not await loop.run_in_executor(
+        None, is_entry_stale, mode, name, year
+    ):
+        return False
+
+    async with semaphore:
+        page_source = await fetch_page(
+            session, bucket, get_page_url(mode, name, year), mode
+        )
+
+    await loop.run_in_executor(
+        None, partial(parse_and_save, page_source, mode, name, year, delta=delta)
+    )
+
+    return True
+
+
+def is_entry_stale(mode: str, name: str, year: int) -> bool:
+    """Whether any table of the 'team' or 'league' page is stale"""
+    list_stats = TEAM_STATS if mode == "team" else ["league"]
+    return any(STORE.is_stale(name, year, stats) for stats in list_stats)
+
+
+def parse_and_save(page_source: str, mode: str, name: str, year: int, delta: bool):
+    tables = understat_json.tables_from_page(page_source, mode, year)
+    save_tables(mode, name, year, tables, delta=delta)
+
+
+async def refresh_async(
+    list_names: List,
+    list_years: List,
+    mode: str,
+    concurrency: int,
+    delta: bool = False,
+    force: bool = False,
+    deadline: float = None,
+) -> Tuple[dict, int]:
+    """See update_db_async, also returns the number of skipped entries"""
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = AsyncTokenBucket(config.REFRESH_RATE, config.REFRESH_BURST)
+    timeout = aiohttp.ClientTimeout(total=config.HTTP_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit_per_host=concurrency)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        tasks = dict()
+        with tqdm(total=len(list_names) * len(list_years), desc=mode) as progress:
+            for name, year in itertools.product(list_names, list_years):
+                task = asyncio.ensure_future(
+                    refresh_entry(
+                        session, semaphore, bucket, mode, name, year, delta, force
+                    )
+                )
+                task.add_done_callback(lambda _: progress.update())
+                tasks[task] = (name, year)
+
+            _, pending = await asyncio.wait(tasks, timeout=deadline)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    errors, n_skipped = dict(), 0
+    for task, (name, year) in tasks.items():
+        if task.cancelled():
+            errors[(name, year)] = "cancelled"
+        elif task.exception() is not None:
+            errors[(name, year)] = repr(task.exception())
+        else:
+            n_skipped += not task.result()
+
+    return errors, n_skipped
+
+
+def update_db_async(
+    list_names: List,
+    list_years: List,
+    stats: str,
+    workers: int = config.ASYNC_CONCURRENCY,
+    delta: bool = False,
+    force: bool = False,
+    deadline: float = None,
+) -> dict:
+    """update_db with the asyncio pipeline: refreshes every stale (name, year)
+    with at most `workers` pages loading at once, and returns the failures as
+    {(name, year): error}. stats is 'team' or 'league'. The entries still
+    running after `deadline` seconds are cancelled and reported as failed"""
+    if stats not in ["team", "league"]:
+        raise AttributeError(f"No such stats {stats}")
+
+    errors, n_skipped = asyncio.run(
+        refresh_async(
+            list_names, list_years, stats, workers, delta, force, deadline=deadline
+        )
+    )
+
+    metrics.increment("refresh_skipped", n_skipped, stats=stats)
+    metrics.increment("refresh_failures", len(errors), stats=stats)
+    metrics.log("refresh_done", stats=stats, skipped=n_skipped, failed=len(errors))
+
+    for (name, year), error in errors.items():
+        metrics.log(
+            "update_failed", logging.WARNING, entity=name, year=year, error=error
+        )
+
+    return errors
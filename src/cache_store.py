@@ -0,0 +1,515 @@
+"""
+The cache of scraped tables, as a single SQLite database.
+
+Every table is one row keyed on (entity, year, stats), entity being a team or
+a league name, along with its fetch time, content hash and source url. A table
+is only rewritten when its content changes, so the content hash is the version
+that the parsed tables and charts are built from, while the fetch time tells
+when the table is stale (see `is_stale`). League tables also fill
+`league_teams`, so all the tables of a league and a season can be read in one
+query. Tables are stored zlib-compressed (about 10 times smaller), the tables
+of stores made by previous versions being compressed on first connection.
+The store is seeded from the archive shipped with the repo (config.ARCHIVE_PATH,
+one `<entity>_<year>_<stats>.txt` member per table, deflate-compressed): a table
+missing from the store is imported on first touch, or all of them at once with
+`import_archive`. `export_archive` writes the store back into an archive.
+
+The `charts` table caches the serialized Bokeh charts built from these tables.
+The `changes` table logs the newly played matches found by delta refreshes, so
+only the charts of the teams that changed need to be dropped.
+The `player_seasons` table is the player index built by `player_index`, and
+`player_tokens` its inverted index of player names.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import json
+import time
+import zipfile
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import config
+
+TEAM_STATS = ["players", "statistics", "matches"]  # the tables of a team page
+ARCHIVE_MEMBER_REGEX = re.compile(
+    r"^(.+)_(\d{4})_(players|statistics|matches|league)\.txt$"
+)
+TEAM_LINK_REGEX = re.compile(r'href="team/([^/"]+)/\d{4}"')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    entity TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    stats TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    html TEXT NOT NULL,
+    content_hash TEXT,
+    source_url TEXT,
+    PRIMARY KEY (entity, year, stats)
+);
+CREATE INDEX IF NOT EXISTS tables_fetched_at
+    ON tables (entity, year, stats, fetched_at);
+CREATE TABLE IF NOT EXISTS charts (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    height INTEGER NOT NULL,
+    item TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS league_teams (
+    league TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    PRIMARY KEY (league, year, team)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    entity TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    changed_at REAL NOT NULL,
+    match_ids TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_changed_at ON changes (changed_at);
+CREATE TABLE IF NOT EXISTS player_seasons (
+    league TEXT,
+    year INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    player TEXT NOT NULL,
+    position TEXT,
+    apps INTEGER,
+    minutes INTEGER,
+    G INTEGER,
+    A INTEGER,
+    Sh90 REAL,
+    KP90 REAL,
+    xG REAL,
+    xA REAL,
+    xG90 REAL,
+    xA90 REAL,
+    diff_xG REAL,
+    diff_xA REAL
+);
+CREATE INDEX IF NOT EXISTS player_seasons_league ON player_seasons (league, year);
+CREATE INDEX IF NOT EXISTS player_seasons_year ON player_seasons (year);
+CREATE INDEX IF NOT EXISTS player_seasons_team ON player_seasons (team, year);
+CREATE INDEX IF NOT EXISTS player_seasons_player ON player_seasons (player);
+CREATE TABLE IF NOT EXISTS player_tokens (
+    token TEXT NOT NULL,
+    player TEXT NOT NULL,
+    PRIMARY KEY (token, player)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS player_index_sources (
+    team TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    PRIMARY KEY (team, year)
+);
+"""
+# columns added to `tables` since its first version
+MIGRATIONS = {"content_hash": "TEXT", "source_url": "TEXT", "encoding": "TEXT"}
+# PRAGMA user_version of a store whose rows are all migrated
+DATA_VERSION = 1
+ENCODING = "zlib"
+
+
+def get_content_hash(html: Union[str, bytes]) -> str:
+    """sha1 of the utf-8 html, whether it is stored compressed or not"""
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    return hashlib.sha1(html).hexdigest()
+
+
+def decode_html(html: Union[str, bytes], encoding: Optional[str]) -> str:
+    """html as stored in `tables`, encoding being NULL for the uncompressed
+    tables of previous versions"""
+    if encoding is None:
+        return html
+    if encoding == "zlib":
+        return zlib.decompress(html).decode("utf-8")
+
+    raise AttributeError(f"No such encoding {encoding}")
+
+
+def get_ttl(year: int, stats: str) -> Optional[float]:
+    """Seconds before a table expires, None if it never does"""
+    if year < config.UPDATE_YEAR:
+        return None
+
+    return config.CACHE_TTL_HOURS[stats] * 3600
+
+
+class CacheStore:
+    def __init__(self, db_path: str, archive_path: str = None):
+        """`archive_path` is the archive the store is seeded from, if any"""
+        self.db_path = db_path
+        self.archive_path = archive_path
+
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """One connection per thread and process, sqlite connections can't be
+        shared: a forked worker (ProcessPoolExecutor) opens its own instead of
+        using the one it inherited (which is left alone, not closed)"""
+        if getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._migrate(connection)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+
+        return self._local.connection
+
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection):
+        """Adds the missing columns to a store made by a previous version,
+        hashes the tables written before content hashes existed and
+        compresses the ones written before compression"""
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(tables)")}
+        with connection:
+            for column, column_type in MIGRATIONS.items():
+                if column not in columns:
+                    connection.execute(
+                        f"ALTER TABLE tables ADD COLUMN {column} {column_type}"
+                    )
+
+        # the rows are only scanned once, not on every new connection
+        (data_version,) = connection.execute("PRAGMA user_version").fetchone()
+        if data_version >= DATA_VERSION:
+            return
+
+        connection.create_function("content_hash", 1, get_content_hash)
+        connection.create_function(
+            "compress", 1, lambda html: zlib.compress(html.encode("utf-8"))
+        )
+        with connection:
+            connection.execute(
+                "UPDATE tables SET content_hash = content_hash(html)"
+                " WHERE content_hash IS NULL"
+            )
+            compressed = connection.execute(
+                "UPDATE tables SET html = compress(html), encoding = ?"
+                " WHERE encoding IS NULL",
+                (ENCODING,),
+            ).rowcount
+            connection.execute(f"PRAGMA user_version = {DATA_VERSION}")
+
+        if compressed:  # gives the freed pages back to the disk
+            try:
+                connection.execute("VACUUM")
+                connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.OperationalError:  # busy, the pages will be reused
+                pass
+
+    def read(self, entity: str, year: int, stats: str) -> Optional[str]:
+        row = self.connection.execute(
+            "SELECT html, encoding FROM tables"
+            " WHERE entity = ? AND year = ? AND stats = ?",
+            (entity, year, stats),
+        ).fetchone()
+
+        if row is None:
+            return self._import_archive_member(entity, year, stats)
+
+        return decode_html(*row)
+
+    def fetched_at(self, entity: str, year: int, stats: str) -> Optional[float]:
+        return self._read_column("fetched_at", entity, year, stats)
+
+    def version(self, entity: str, year: int, stats: str) -> Optional[str]:
+        """Content hash of a table, changes only when the table does"""
+        return self._read_column("content_hash", entity, year, stats)
+
+    def source_url(self, entity: str, year: int, stats: str) -> Optional[str]:
+        return self._read_column("source_url", entity, year, stats)
+
+    def is_stale(self, entity: str, year: int, stats: str) -> bool:
+        """True if the table is missing or older than its TTL (see get_ttl)"""
+        fetched_at = self.fetched_at(entity, year, stats)
+        if fetched_at is None:
+            return True
+
+        ttl = get_ttl(year, stats)
+        return ttl is not None and time.time() - fetched_at > ttl
+
+    def _read_column(self, column: str, entity: str, year: int, stats: str):
+        row = self.connection.execute(
+            f"SELECT {column} FROM tables WHERE entity = ? AND year = ? AND stats = ?",
+            (entity, year, stats),
+        ).fetchone()
+
+        if row is None:
+            if self._import_archive_member(entity, year, stats) is None:
+                return None
+            return self._read_column(column, entity, year, stats)
+
+        return row[0]
+
+    def write_tables(
+        self,
+        entity: str,
+        year: int,
+        tables: Dict[str, str],
+        fetched_at: float = None,
+        source_url: str = None,
+        new_matches: List[int] = None,
+    ) -> List[str]:
+        """Writes all the {stats: html} tables of an entity in one transaction,
+        logging `new_matches` (ids of newly played matches) in `changes`.
+        A table with an unchanged content only gets its fetch time updated,
+        returns the stats of the tables that did change"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+
+        changed = []
+        with self.connection:
+            if new_matches is not None:
+                self.connection.execute(
+                    "INSERT INTO changes VALUES (?, ?, ?, ?)",
+                    (entity, year, fetched_at, json.dumps(new_matches)),
+                )
+            for stats, html in tables.items():
+                data = html.encode("utf-8")
+                content_hash = get_content_hash(data)
+                unchanged = self.connection.execute(
+                    """
+                    UPDATE tables SET fetched_at = ?, source_url = ?
+                    WHERE entity = ? AND year = ? AND stats = ? AND content_hash = ?
+                    """,
+                    (fetched_at, source_url, entity, year, stats, content_hash),
+                ).rowcount
+                if not unchanged:
+                    self.connection.execute(
+                        """
+                        INSERT OR REPLACE INTO tables (
+                            entity, year, stats, fetched_at, html, content_hash,
+                            source_url, encoding
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            entity,
+                            year,
+                            stats,
+                            fetched_at,
+                            zlib.compress(data),
+                            content_hash,
+                            source_url,
+                            ENCODING,
+                        ),
+                    )
+                    changed.append(stats)
+
+            if "league" in changed:
+                self.connection.execute(
+                    "DELETE FROM league_teams WHERE league = ? AND year = ?",
+                    (entity, year),
+                )
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO league_teams VALUES (?, ?, ?)",
+                    [
+                        (entity, year, team)
+                        for team in TEAM_LINK_REGEX.findall(tables["league"])
+                    ],
+                )
+
+        return changed
+
+    def touch(
+        self, entity: str, year: int, list_stats: List[str], fetched_at: float = None
+    ):
+        """Marks tables as fetched again, without any change"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self.connection:
+            self.connection.executemany(
+                """
+                UPDATE tables SET fetched_at = ?
+                WHERE entity = ? AND year = ? AND stats = ?
+                """,
+                [(fetched_at, entity, year, stats) for stats in list_stats],
+            )
+
+    def league_teams(self, league: str, year: int) -> list:
+        if self.read(league, year, "league") is None:
+            return []
+
+        rows = self.connection.execute(
+            "SELECT team FROM league_teams WHERE league = ? AND year = ? ORDER BY team",
+            (league, year),
+        )
+        return [team for team, in rows]
+
+    def read_league_tables(self, league: str, year: int, stats: str) -> Dict[str, str]:
+        """{team: html} of the `stats` table of every team of the league"""
+        teams = self.league_teams(league, year)
+        tables = {
+            team: decode_html(html, encoding)
+            for team, html, encoding in self.connection.execute(
+                """
+                SELECT tables.entity, tables.html, tables.encoding
+                FROM league_teams
+                JOIN tables ON tables.entity = league_teams.team
+                    AND tables.year = league_teams.year
+                WHERE league_teams.league = ? AND league_teams.year = ?
+                    AND tables.stats = ?
+                """,
+                (league, year, stats),
+            )
+        }
+
+        for team in teams:
+            if team not in tables:  # not imported from the text files yet
+                html = self.read(team, year, stats)
+                if html is not None:
+                    tables[team] = html
+
+        return tables
+
+    def read_seasons(
+        self, entity: str, years: List[int], stats: str
+    ) -> Dict[int, str]:
+        """{year: html} of the `stats` table of an entity over several seasons,
+        in one query, seasons missing from the cache being left out"""
+        tables = {
+            year: decode_html(html, encoding)
+            for year, html, encoding in self.connection.execute(
+                f"""
+                SELECT year, html, encoding FROM tables
+                WHERE entity = ? AND stats = ? AND year IN ({", ".join("?" * len(years))})
+                """,
+                (entity, stats, *years),
+            )
+        }
+
+        for year in years:
+            if year not in tables:  # not imported from the text files yet
+                html = self.read(entity, year, stats)
+                if html is not None:
+                    tables[year] = html
+
+        return tables
+
+    def keys(self, stats: str = None) -> Iterable[Tuple[str, int, str]]:
+        query = "SELECT entity, year, stats FROM tables"
+        if stats is None:
+            return self.connection.execute(query).fetchall()
+        return self.connection.execute(f"{query} WHERE stats = ?", (stats,)).fetchall()
+
+    def versions(self, stats: str) -> List[Tuple[str, int, str]]:
+        """(entity, year, content hash) of all the `stats` tables"""
+        return self.connection.execute(
+            "SELECT entity, year, content_hash FROM tables WHERE stats = ?", (stats,)
+        ).fetchall()
+
+    def changes_since(self, timestamp: float) -> List[Tuple[str, int, List[int]]]:
+        """(entity, year, new match ids) of the delta refreshes since `timestamp`"""
+        rows = self.connection.execute(
+            "SELECT entity, year, match_ids FROM changes WHERE changed_at >= ?"
+            " ORDER BY changed_at",
+            (timestamp,),
+        )
+        return [
+            (entity, year, json.loads(match_ids)) for entity, year, match_ids in rows
+        ]
+
+    def read_chart(self, key: str, fingerprint: str) -> Optional[Tuple[str, int]]:
+        """Returns the (serialized chart, height) built from the data version
+        `fingerprint`, or None if missing or built from another version"""
+        return self.connection.execute(
+            "SELECT item, height FROM charts WHERE key = ? AND fingerprint = ?",
+            (key, fingerprint),
+        ).fetchone()
+
+    def write_chart(self, key: str, fingerprint: str, item: str, height: int):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO charts VALUES (?, ?, ?, ?)",
+                (key, fingerprint, height, item),
+            )
+
+    def delete_charts(self, entity: str, year: int) -> int:
+        """Drops the charts of an entity and a season, whatever their kind
+        and options (keys are "kind/entity/year[/options...]")"""
+        with self.connection:
+            return self.connection.execute(
+                "DELETE FROM charts WHERE key GLOB ? OR key GLOB ?",
+                (f"*/{entity}/{year}", f"*/{entity}/{year}/*"),
+            ).rowcount
+
+    def import_archive(self, archive_path: str = None) -> Tuple[int, list]:
+        """Imports the tables of the archive that are not in the store yet,
+        returns the number of imported tables and the names of the skipped
+        members"""
+        archive_path = archive_path or self.archive_path
+        known_keys = set(self.keys())
+
+        imported, skipped = 0, []
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in sorted(archive.namelist()):
+                match = ARCHIVE_MEMBER_REGEX.match(member)
+                if match is None:
+                    skipped.append(member)
+                    continue
+
+                entity, year, stats = match.groups()
+                if (entity, int(year), stats) not in known_keys:
+                    self._import_archive_member(entity, int(year), stats, archive)
+                    imported += 1
+
+        return imported, skipped
+
+    def _import_archive_member(
+        self, entity: str, year: int, stats: str, archive: zipfile.ZipFile = None
+    ) -> Optional[str]:
+        if archive is None:
+            if self.archive_path is None or not os.path.exists(self.archive_path):
+                return None
+            with zipfile.ZipFile(self.archive_path) as archive:
+                return self._import_archive_member(entity, year, stats, archive)
+
+        member = f"{entity}_{year}_{stats}.txt"
+        try:
+            info = archive.getinfo(member)
+        except KeyError:
+            return None
+
+        html = archive.read(info).decode("utf-8")
+        self.write_tables(
+            entity,
+            year,
+            {stats: html},
+            fetched_at=time.mktime((*info.date_time, 0, 0, -1)),
+            source_url=f"{archive.filename}/{member}",
+        )
+
+        return html
+
+    def export_archive(self, archive_path: str) -> int:
+        """Writes every table of the store to a new archive (e.g. to update the
+        one of the repo after a refresh), returns the number of tables"""
+        rows = self.connection.execute(
+            "SELECT entity, year, stats, html, encoding, fetched_at FROM tables"
+            " ORDER BY entity, year, stats"
+        ).fetchall()
+
+        fd, tmp_path = tempfile.mkstemp(
+            suffix=".tmp", dir=os.path.dirname(archive_path) or "."
+        )
+        os.close(fd)
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for entity, year, stats, html, encoding, fetched_at in rows:
+                # the member date is the fetch time, restored on import
+                info = zipfile.ZipInfo(
+                    f"{entity}_{year}_{stats}.txt",
+                    date_time=time.localtime(fetched_at)[:6],
+                )
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, decode_html(html, encoding), compresslevel=9)
+        os.replace(tmp_path, archive_path)
+
+        return len(rows)
+
+STORE = CacheStore(config.CACHE_DB_PATH, archive_path=config.ARCHIVE_PATH)
@@ -4,8 +4,23 @@ Base config file to update for teams, years, etc.
 import os
 
 CACHE_PATH = "data_cache"
-UPDATE_DB = True 
+ARCHIVE_PATH = os.path.join(CACHE_PATH, "tables.zip")  # seed of the cache store
+# another store (and parsed tier next to it), e.g. a throwaway one for tests
+CACHE_DB_PATH = os.environ.get(
+    "XG_TRACKER_DB_PATH", os.path.join(CACHE_PATH, "xg_tracker.sqlite")
+)
+PARSED_CACHE_PATH = os.path.join(os.path.dirname(CACHE_DB_PATH), "parsed")
+PARSERS_VERSION = 3  # bump when the parsers output changes, rebuilds parsed tables
+PARSED_COMPRESSION = "uncompressed"  # or 'lz4'/'zstd': smaller, but no zero-copy reads
+METRICS_PATH = os.path.join(CACHE_PATH, "metrics")  # <component>.prom files
+LOG_LEVEL = os.environ.get("XG_TRACKER_LOG_LEVEL", "INFO")  # DEBUG logs the spans
+MEMOIZE = True  # False runs the memoized functions every time (benchmarks)
+MEMO_MAX_ENTRIES = 256  # results kept in memory per memoized function
 UPDATE_YEAR = 2021
+REFRESH_INTERVAL_HOURS = 6  # sleep between two runs of `refresh.py --daemon`
+# hours before a cached table of the current season (UPDATE_YEAR) is stale,
+# the tables of past seasons never expire
+CACHE_TTL_HOURS = {"matches": 6, "league": 6, "players": 12, "statistics": 24}
 
 
 if "DYNO" in os.environ:  # heroku env
@@ -15,8 +30,28 @@ else:  # local env
     GOOGLE_CHROME_PATH = ""
     CHROMEDRIVER_PATH = "/Users/paulemiledugnat/Desktop/Data Science X/xg-tracker/src/chromedriver"
 
+UNDERSTAT_URL = os.environ.get("UNDERSTAT_URL", "https://understat.com")
+FETCH_BACKEND = "http"  # 'http' (json blobs, falls back to selenium) or 'selenium'
+HTTP_TIMEOUT = 20  # seconds
+HTTP_RETRIES = 3  # retries of a throttled (429), failed (5xx) or timed out request
+HTTP_BACKOFF = 0.5  # seconds before the first retry, doubled at each retry
+
+DRIVER_POOL_SIZE = 2  # max number of Chrome sessions alive at once, per process
+DRIVER_MAX_PAGES = 50  # a driver is recycled after this many page loads
+
+REFRESH_WORKERS = DRIVER_POOL_SIZE  # one browser per thread worker
+REFRESH_RATE = 1.0  # average requests per second sent to understat
+REFRESH_BURST = 2  # max requests sent at once after an idle period
+ASYNC_CONCURRENCY = 8  # pages loading at once with `refresh.py --executor async`
+
 LIST_OF_YEARS = [2021, 2020, 2019, 2018, 2017, 2016, 2015, 2014]
 
+# rolling xG of the team charts, in matches: every window and half-life is
+# computed when a calendar is parsed, the sidebar only picks among them
+ROLLING_WINDOWS = (3, 6, 10)
+DEFAULT_ROLLING_WINDOW = 6
+EWMA_HALF_LIVES = (2, 4, 8)
+
 LIST_OF_COUNTRIES = [
     "<Choix d'un pays>",
     "France",
@@ -163,6 +198,18 @@ COUNTRY_LEAGUES = {
     "Italie": "Serie_A",
 }
 
+# columns of the player index (see player_index.py) to rank players by
+PLAYER_METRICS = {
+    "diff_xG": "Buts - xG",
+    "diff_xA": "Passes dé - xA",
+    "G": "Buts",
+    "A": "Passes dé",
+    "xG": "xG",
+    "xA": "xA",
+    "xG90": "xG par 90 min",
+    "xA90": "xA par 90 min",
+}
+
 HIDE_FOOTER = """
             <style>
             # MainMenu {visibility: hidden;}
@@ -0,0 +1,135 @@
+"""
+Bounded pool of headless Chrome sessions.
+
+Starting Chrome is most of the cost of a scrape, so drivers are kept alive
+and lent to callers (`update_db` and interactive cache misses) instead of
+being launched and quit for every page.
+"""
+import atexit
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+
+import config
+import metrics
+
+
+def get_driver():
+    if "DYNO" in os.environ:  # if in heroku env
+        chrome_options = webdriver.ChromeOptions()
+        chrome_options.binary_location = os.environ.get(
+            "GOOGLE_CHROME_SHIM", None)
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--no-sandbox")
+
+    else:  # if in local env
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+
+    driver = webdriver.Chrome(
+        options=chrome_options, executable_path=config.CHROMEDRIVER_PATH
+    )
+
+    return driver
+
+
+class DriverPool:
+    """Lends at most `size` drivers at a time, each one being recycled
+    (quit and replaced) after `max_pages` page loads."""
+
+    def __init__(self, size: int, max_pages: int, driver_factory=get_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.driver_factory = driver_factory
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._pages = dict()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def borrow(self, timeout: float = None):
+        """Yields a healthy driver, to be used for one page load"""
+        if self._closed:
+            raise RuntimeError("driver pool is shut down")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"no driver available after {timeout}s")
+
+        try:
+            driver = self._take_driver()
+            try:
+                yield driver
+            except BaseException:
+                # any failure (WebDriverException, dead chromedriver, timeout,
+                # KeyboardInterrupt...) leaves the browser in an unknown state
+                self._discard(driver)
+                raise
+            self._give_back(driver)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        self._closed = True
+        self.close_idle()
+
+    def close_idle(self):
+        """Quits the drivers nobody is using, e.g. before a long sleep"""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+    def _take_driver(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                with metrics.span("driver_launch"):
+                    driver = self.driver_factory()
+                metrics.increment("driver_launches")
+                with self._lock:
+                    self._pages[id(driver)] = 0
+                return driver
+
+            if self._is_healthy(driver):
+                return driver
+            self._discard(driver)
+
+    def _give_back(self, driver):
+        with self._lock:
+            self._pages[id(driver)] += 1
+            worn_out = self._pages[id(driver)] >= self.max_pages
+
+        if worn_out or self._closed:
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+
+    def _discard(self, driver):
+        metrics.increment("driver_discards")
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:  # pylint:disable=broad-except
+            pass  # chromedriver already dead: nothing left to quit
+
+    @staticmethod
+    def _is_healthy(driver) -> bool:
+        try:
+            driver.current_url  # pylint:disable=pointless-statement
+            return True
+        except WebDriverException:
+            return False
+
+
+DRIVER_POOL = DriverPool(config.DRIVER_POOL_SIZE, config.DRIVER_MAX_PAGES)
+atexit.register(DRIVER_POOL.shutdown)
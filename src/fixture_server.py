@@ -0,0 +1,319 @@
+"""
+Local stand-in for understat.com, built from the tables of the cache.
+
+Each page holds the cached tables (what the Selenium backend reads) and the
+matching `JSON.parse('...')` blobs (what the http backend reads), so both
+backends can be exercised offline:
+
+    python src/fixture_server.py --port 8000
+    UNDERSTAT_URL=http://localhost:8000 XG_TRACKER_DB_PATH=/tmp/xg/store.sqlite \
+        python src/refresh.py --years 2019
+
+The pages are rendered from the cache store: the refresh writes to another one
+(XG_TRACKER_DB_PATH), so a run with injected failures (see Faults) can't damage
+the real cache:
+
+    python src/fixture_server.py --delay 0.2 --throttle-rate 0.1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+from bs4 import BeautifulSoup
+
+import config
+from cache_store import STORE
+from understat_json import SITUATIONS
+
+PAGE_REGEX = re.compile(r"^/(team|league)/([^/]+)/(\d{4})/?$")
+
+
+def encode_js_string(data) -> str:
+    """Escapes json the way understat does: every special byte as \\xHH"""
+    return "".join(
+        chr(byte) if byte < 128 and (chr(byte).isalnum() or chr(byte) in " ._-")
+        else f"\\x{byte:02X}"
+        for byte in json.dumps(data, ensure_ascii=False).encode("utf-8")
+    )
+
+
+def _value(cell) -> float:
+    """First number of a cell, without the understat '+/-' delta"""
+    return float(re.split(r"(?<=\d)[+-]", cell.get_text())[0] or 0)
+
+
+def _body_rows(table_html: str) -> list:
+    soup = BeautifulSoup(table_html, "lxml")
+    tbody = soup.find("tbody")
+    return [row.find_all("td") for row in tbody.find_all("tr")] if tbody else []
+
+
+def players_data(table_html: str) -> list:
+    players = []
+    for j, cells in enumerate(_body_rows(table_html)):
+        minutes = int(_value(cells[4]))
+        players.append(
+            {
+                "id": str(j),
+                "player_name": cells[1].get_text(),
+                "games": str(int(_value(cells[3]))),
+                "time": str(minutes),
+                "goals": str(int(_value(cells[5]))),
+                "assists": str(int(_value(cells[6]))),
+                "shots": str(round(_value(cells[7]) * minutes / 90)),
+                "key_passes": str(round(_value(cells[8]) * minutes / 90)),
+                "xG": str(_value(cells[9])),
+                "xA": str(_value(cells[10])),
+                "position": cells[2].get_text(),
+            }
+        )
+
+    return players
+
+
+def statistics_data(table_html: str) -> dict:
+    keys = {name: key for key, name in SITUATIONS.items()}
+
+    situations = dict()
+    for cells in _body_rows(table_html):
+        situation = cells[1].get_text()
+        situations[keys.get(situation, situation)] = {
+            "shots": int(_value(cells[2])),
+            "goals": int(_value(cells[3])),
+            "xG": _value(cells[6]),
+            "against": {
+                "shots": int(_value(cells[4])),
+                "goals": int(_value(cells[5])),
+                "xG": _value(cells[7]),
+            },
+        }
+
+    return {"situation": situations}
+
+
+def dates_data(calendar_html: str, team_name: str, year: int) -> list:
+    team_title = team_name.replace("_", " ")
+    soup = BeautifulSoup(calendar_html, "lxml")
+
+    dates = []
+    for j, container in enumerate(
+        soup.find_all("div", {"class": "calendar-date-container"})
+    ):
+        date_tag = container.find("div", {"class": "calendar-date"})
+        side = date_tag["data-side"]
+        opponent = container.find("div", {"class": "team-title"}).get_text()
+        match = {
+            "id": str(year * 1000 + j),
+            "isResult": date_tag.has_attr("data-result"),
+            "side": side,
+            "h": {"title": team_title if side == "h" else opponent},
+            "a": {"title": opponent if side == "h" else team_title},
+            "datetime": f"{_iso_date(date_tag.get_text())} 20:00:00",
+        }
+
+        if match["isResult"]:
+            goals = container.find("div", {"class": "teams-goals"}).find_all("span")
+            x_goals = container.find("div", {"class": "teams-xG"}).find_all("span")
+            match["result"] = date_tag["data-result"]
+            match["goals"] = {"h": goals[0].get_text(), "a": goals[1].get_text()}
+            match["xG"] = {"h": x_goals[0].get_text(), "a": x_goals[1].get_text()}
+
+        dates.append(match)
+
+    return dates
+
+
+def _iso_date(date: str) -> str:
+    return datetime.strptime(date, "%b %d, %Y").strftime("%Y-%m-%d")
+
+
+def teams_data(table_html: str) -> dict:
+    """understat gives one history entry per match: the season totals are
+    put in the first entry, the other ones only carry the result"""
+    teams = dict()
+    for j, cells in enumerate(_body_rows(table_html)):
+        n_matches, wins, draws = (int(_value(cells[k])) for k in (2, 3, 4))
+        history = [
+            {
+                "wins": int(k < wins),
+                "draws": int(wins <= k < wins + draws),
+                "loses": int(k >= wins + draws),
+                "scored": 0,
+                "missed": 0,
+                "pts": 0,
+                "xG": 0,
+                "xGA": 0,
+                "xpts": 0,
+            }
+            for k in range(n_matches)
+        ]
+        history[0].update(
+            scored=int(_value(cells[6])),
+            missed=int(_value(cells[7])),
+            pts=int(_value(cells[8])),
+            xG=_value(cells[9]),
+            xGA=_value(cells[10]),
+            xpts=_value(cells[11]),
+        )
+        teams[str(j)] = {"id": str(j), "title": cells[1].get_text(), "history": history}
+
+    return teams
+
+
+def _read_cache(name: str, year: int, stats: str) -> str:
+    table_html = STORE.read(name, year, stats)
+    if table_html is None:
+        raise FileNotFoundError(f"{name}_{year}_{stats}")
+
+    return table_html
+
+
+def _script(blobs: dict) -> str:
+    lines = "".join(
+        f"var {name} = JSON.parse('{encode_js_string(data)}');\n"
+        for name, data in blobs.items()
+    )
+    return f"<script>\n{lines}</script>"
+
+
+def make_page(mode: str, name: str, year: int) -> str:
+    """Raises FileNotFoundError if the page is not in the cache"""
+    list_stats = ["players", "statistics", "matches"] if mode == "team" else ["league"]
+    versions = tuple(STORE.version(name, year, stats) for stats in list_stats)
+    if None in versions:
+        raise FileNotFoundError(f"{name}_{year}_{mode}")
+
+    return _render_page(mode, name, year, versions)
+
+
+@lru_cache(maxsize=1024)
+def _render_page(
+    mode: str, name: str, year: int, versions: tuple  # pylint:disable=unused-argument
+) -> str:
+    """Renders are kept while the versions of the tables are unchanged"""
+    if mode == "team":
+        players = _read_cache(name, year, "players")
+        statistics = _read_cache(name, year, "statistics")
+        calendar = _read_cache(name, year, "matches")
+        body = (
+            f'<div id="team-players">{players}</div>'
+            f'<div id="team-statistics">{statistics}</div>'
+            f"{calendar}"
+            + _script(
+                {
+                    "datesData": dates_data(calendar, name, year),
+                    "statisticsData": statistics_data(statistics),
+                    "playersData": players_data(players),
+                }
+            )
+        )
+    else:
+        league = _read_cache(name, year, "league")
+        body = f'<div id="league-chemp">{league}</div>' + _script(
+            {"teamsData": teams_data(league)}
+        )
+
+    return f"<html><body>{body}</body></html>"
+
+
+class Faults(NamedTuple):
+    """Failures injected by the server, rates being shares of the requests"""
+
+    delay: float = 0  # seconds added to every response
+    timeout_rate: float = 0  # requests left without response for `hang` seconds
+    throttle_rate: float = 0  # requests answered 429, with a Retry-After header
+    error_rate: float = 0  # requests answered 503
+    malformed_rate: float = 0  # pages cut in the middle of their json blobs
+    hang: float = 60
+    retry_after: float = 1
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    faults = Faults()
+
+    def do_GET(self):  # pylint:disable=invalid-name
+        time.sleep(self.faults.delay)
+
+        draw = random.random()
+        if draw < self.faults.timeout_rate:
+            time.sleep(self.faults.hang)
+            return
+        draw -= self.faults.timeout_rate
+        if draw < self.faults.throttle_rate:
+            self.send_response(429)
+            self.send_header("Retry-After", f"{self.faults.retry_after:g}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        draw -= self.faults.throttle_rate
+        if draw < self.faults.error_rate:
+            self.send_error(503)
+            return
+        draw -= self.faults.error_rate
+
+        match = PAGE_REGEX.match(self.path)
+        try:
+            if match is None:
+                raise FileNotFoundError(self.path)
+            mode, name, year = match.groups()
+            page = make_page(mode, name, int(year)).encode("utf-8")
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+
+        if draw < self.faults.malformed_rate:
+            page = page[: page.find(b"JSON.parse(") + 64]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):  # pylint:disable=redefined-builtin
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    request_queue_size = 128  # the default 5 refuses concurrent refresh workers
+    daemon_threads = True  # hanging requests don't block the shutdown
+
+
+def make_server(port: int = 0, faults: Faults = Faults()) -> FixtureServer:
+    handler = type("FixtureHandler", (FixtureHandler,), {"faults": faults})
+    return FixtureServer(("localhost", port), handler)
+
+
+def start_fixture_server(
+    port: int = 0, faults: Faults = Faults()
+) -> FixtureServer:
+    """Serves in a background thread, the url is
+    f"http://localhost:{server.server_port}" """
+    server = make_server(port, faults)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the cache store as understat")
+    parser.add_argument("--port", type=int, default=8000)
+    for field, default in Faults._field_defaults.items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=float, default=default)
+    args = parser.parse_args()
+
+    faults = Faults(**{field: getattr(args, field) for field in Faults._fields})
+    server = make_server(args.port, faults)
+    print(f"serving {config.CACHE_DB_PATH} on http://localhost:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Lightweight instrumentation: timed spans, counters and structured logs.
+
+    with span("parse", stats="players"):
+        ...
+    increment("cache_requests", stats="players", result="hit")
+    log("saved", entity="Lille", year=2020)
+
+Every event is logged as one json line on the "xg_tracker" logger (spans at
+DEBUG level, see config.LOG_LEVEL), and aggregated in memory per name and
+labels. `export_prometheus` renders the aggregates in the Prometheus text
+format, `write_metrics` writes them to config.METRICS_PATH (a directory a node
+exporter textfile collector can read) and `start_metrics_server` serves them
+on /metrics. Aggregates are per process: the workers of a process pool keep
+their own.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+PREFIX = "xg_tracker"
+# upper bounds of the span duration histogram, in seconds
+BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+LOGGER = logging.getLogger(PREFIX)
+if not LOGGER.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    LOGGER.addHandler(_handler)
+    LOGGER.setLevel(config.LOG_LEVEL)
+    LOGGER.propagate = False
+
+_lock = threading.Lock()
+_counters = dict()  # (name, labels) -> value
+_spans = dict()  # labels -> [count per bucket..., count, sum]
+_write_lock = threading.Lock()
+_last_writes = dict()  # component -> time.monotonic() of its last write
+
+
+def log(event: str, level: int = logging.INFO, **fields):
+    if LOGGER.isEnabledFor(level):
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "event": event,
+        }
+        LOGGER.log(level, json.dumps({**record, **fields}, default=str))
+
+
+def increment(name: str, value: float = 1, **labels):
+    key = name, tuple(sorted(labels.items()))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Records a span of `seconds`, see span"""
+    key = tuple(sorted({"span": name, **labels}.items()))
+    with _lock:
+        values = _spans.setdefault(key, [0] * (len(BUCKETS) + 2))
+        for j, bound in enumerate(BUCKETS):
+            values[j] += seconds <= bound
+        values[-2] += 1
+        values[-1] += seconds
+
+    log("span", logging.DEBUG, span=name, ms=round(seconds * 1000, 3), **labels)
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Times the block, failed blocks being recorded with error="true" """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe(name, time.perf_counter() - start, error="true", **labels)
+        raise
+    observe(name, time.perf_counter() - start, **labels)
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def export_prometheus() -> str:
+    with _lock:
+        counters = sorted(_counters.items())
+        spans = sorted((labels, list(values)) for labels, values in _spans.items())
+
+    lines = []
+    for name in sorted({name for (name, _), _ in counters}):
+        lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+        lines.extend(
+            f"{PREFIX}_{name}_total{_format_labels(labels)} {value:g}"
+            for (counter_name, labels), value in counters
+            if counter_name == name
+        )
+
+    if spans:
+        lines.append(f"# TYPE {PREFIX}_span_seconds histogram")
+    for labels, values in spans:
+        for bound, count in zip(
+            [*BUCKETS, "+Inf"], [*values[: len(BUCKETS)], values[-2]]
+        ):
+            lines.append(
+                f"{PREFIX}_span_seconds_bucket"
+                f"{_format_labels((*labels, ('le', bound)))} {count}"
+            )
+        lines.append(
+            f"{PREFIX}_span_seconds_sum{_format_labels(labels)} {values[-1]:.6f}"
+        )
+        lines.append(
+            f"{PREFIX}_span_seconds_count{_format_labels(labels)} {values[-2]}"
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(component: str, min_interval: float = 0):
+    """Writes the metrics of this process to config.METRICS_PATH/<component>.prom,
+    unless they were written less than `min_interval` seconds ago"""
+    with _write_lock:
+        now = time.monotonic()
+        last_write = _last_writes.get(component)
+        if last_write is not None and now - last_write < min_interval:
+            return
+        _last_writes[component] = now
+
+        # a temporary file per write: other processes may write the same file
+        os.makedirs(config.METRICS_PATH, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f"{component}.", suffix=".tmp", dir=config.METRICS_PATH
+        )
+        try:
+            with os.fdopen(fd, "w") as metrics_file:
+                metrics_file.write(export_prometheus())
+            os.replace(tmp_path, os.path.join(config.METRICS_PATH, f"{component}.prom"))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint:disable=invalid-name
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = export_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint:disable=redefined-builtin
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serves /metrics in a background thread"""
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
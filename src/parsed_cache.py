@@ -0,0 +1,116 @@
+"""
+Second cache tier: processed DataFrames stored as uncompressed Arrow (feather)
+files, read back memory-mapped so a page view skips HTML parsing entirely.
+
+Each entry records the fingerprint of the raw table it was parsed from (its
+content hash in the cache store) and config.PARSERS_VERSION, and is rebuilt as
+soon as that raw table or the parsers change. `precompute.py` fills the whole
+tier at once.
+"""
+import os
+import tempfile
+from typing import Any, Callable
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+import config
+import metrics
+
+SOURCE_KEY = b"xg_tracker_source"
+
+
+def get_table_key(entity: str, year: int, stats: str) -> str:
+    """Key of the parsed version of a cache store table"""
+    return f"{entity}_{year}_{stats}"
+
+
+def get_parsed_path(key: str) -> str:
+    return os.path.join(config.PARSED_CACHE_PATH, f"{key}.feather")
+
+
+def _stamp(fingerprint: bytes) -> bytes:
+    return f"{config.PARSERS_VERSION}:".encode() + fingerprint
+
+
+def read_parsed(key: str, fingerprint: bytes):
+    """Returns the cached DataFrame, or None if missing or stale"""
+    try:
+        table = feather.read_table(get_parsed_path(key), memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    if (table.schema.metadata or {}).get(SOURCE_KEY) != _stamp(fingerprint):
+        return None
+
+    return table.to_pandas()
+
+
+def is_fresh(key: str, fingerprint: bytes) -> bool:
+    """Same check as read_parsed, reading the schema only"""
+    try:
+        with pa.memory_map(get_parsed_path(key)) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata
+    except (OSError, pa.ArrowInvalid):
+        return False
+
+    return (metadata or {}).get(SOURCE_KEY) == _stamp(fingerprint)
+
+
+def write_parsed(
+    key: str,
+    fingerprint: bytes,
+    df: pd.DataFrame,
+    compression: str = config.PARSED_COMPRESSION,
+):
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), SOURCE_KEY: _stamp(fingerprint)}
+    )
+
+    # a temporary file per writer: sessions (or precompute.py) parsing the same
+    # table at once each replace the entry with a complete file
+    os.makedirs(config.PARSED_CACHE_PATH, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f"{key}.", suffix=".tmp", dir=config.PARSED_CACHE_PATH
+    )
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path, compression=compression)
+        os.replace(tmp_path, get_parsed_path(key))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def delete_parsed(key: str):
+    try:
+        os.remove(get_parsed_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def get_parsed_table(
+    key: str,
+    fingerprint: bytes,
+    read_raw: Callable[[], Any],
+    parse: Callable[[Any], pd.DataFrame],
+) -> pd.DataFrame:
+    """Reads `key` from the parsed tier, or parses the raw table(s)
+    given by `read_raw` with `parse` and stores the result"""
+    stats = key.rsplit("_", 1)[-1]  # keys end with the stats of the table
+    with metrics.span("parsed_read", stats=stats):
+        df = read_parsed(key, fingerprint)
+
+    metrics.increment(
+        "parsed_cache_requests", stats=stats, result="miss" if df is None else "hit"
+    )
+    if df is None:
+        with metrics.span("cache_read", stats=stats):
+            raw = read_raw()
+        with metrics.span("parse", stats=stats):
+            df = parse(raw)
+        write_parsed(key, fingerprint, df)
+
+    return df
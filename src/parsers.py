@@ -0,0 +1,139 @@
+"""
+Fast parsers for the understat tables of the cache, built on lxml.
+"""
+import io
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+# a number, optionally followed by the understat "+/-" delta (e.g. "39.76-2.24")
+NUMBER_REGEX = r"^([+-]?\d+(?:\.\d+)?)(?:[+-]\d+(?:\.\d+)?)?$"
+# body cells, without the "table-total" row of the players tables (kept as a
+# string, st.cache can't hash the compiled XPath used by memoized functions)
+BODY_CELLS_XPATH = "//tbody[not(contains(@class, 'table-total'))]/tr/td"
+
+
+def parse_understat_table(html_table: str) -> pd.DataFrame:
+    """Reads an understat table in one pass over its cells. The totals
+    row is dropped, and numeric columns are typed, expected values (xG, xA,
+    xGA, xPTS...) keeping only the value before their "+/-" delta"""
+    tree = etree.HTML(html_table)
+
+    headers = ["".join(th.itertext()).strip() for th in tree.iter("th")]
+    if not headers:
+        raise ValueError("No table found")
+
+    # a cell's own text is enough, except for links (player and team names)
+    cells = [
+        (td.text or "".join(td.itertext())).strip() for td in tree.xpath(BODY_CELLS_XPATH)
+    ]
+
+    # one vectorized extraction for the whole table, then one column at a time
+    text = np.array(cells, dtype=object).reshape(-1, len(headers))
+    numbers = (
+        pd.Series(cells, dtype=object)
+        .str.extract(NUMBER_REGEX, expand=False)
+        .to_numpy()
+        .reshape(-1, len(headers))
+    )
+    is_numeric = ~pd.isna(numbers).any(axis=0)
+
+    return pd.DataFrame(
+        {
+            header: _to_number(numbers[:, j]) if is_numeric[j] else text[:, j]
+            for j, header in enumerate(headers)
+        }
+    )
+
+
+def _to_number(column: np.ndarray) -> np.ndarray:
+    """int array when no value has decimals, float array otherwise"""
+    if any("." in value for value in column):
+        return column.astype(float)
+
+    return column.astype(int)
+
+
+CALENDAR_COLUMNS = [
+    "match_id",
+    "position",
+    "date",
+    "opponent",
+    "team_side",
+    "match_result",
+    "home_xGoals",
+    "away_xGoals",
+]
+
+
+class Calendar(NamedTuple):
+    """played: {column: array} of the played matches, `position` being their
+    index in the calendar (postponed fixtures keep their original place),
+    unplayed: one {date, opponent, team_side} dict per fixture to come"""
+
+    played: dict
+    unplayed: list
+
+
+def parse_calendar(calendar_html: str) -> Calendar:
+    """Streams through a team calendar once, without building the tree"""
+    columns = {col: [] for col in CALENDAR_COLUMNS}
+    unplayed = []
+
+    match, in_xg, position = None, False, -1
+    events = etree.iterparse(
+        io.BytesIO(calendar_html.encode("utf-8")), events=("start", "end"), html=True
+    )
+    for event, element in events:
+        classes = element.get("class", "").split()
+
+        if event == "start":
+            if "calendar-date-container" in classes:
+                match = {"xG": []}
+                position += 1
+            elif "teams-xG" in classes:
+                in_xg = True
+            continue
+
+        # end of the element: its text is complete
+        if "calendar-date" in classes:
+            match["date"] = element.text
+            match["team_side"] = element.get("data-side")
+            match["match_result"] = element.get("data-result")
+        elif "match-info" in classes:
+            match["is_result"] = element.get("data-isresult") == "true"
+            match["href"] = element.get("href", "")
+        elif "teams-xG" in classes:
+            in_xg = False
+        elif in_xg and element.tag == "span":
+            match["xG"].append(float("".join(element.itertext())))
+        elif "team-title" in classes:
+            match["opponent"] = "".join(element.itertext())
+        elif "calendar-date-container" in classes:
+            if match.get("is_result"):
+                columns["match_id"].append(int(match["href"].rsplit("/", 1)[-1]))
+                columns["position"].append(position)
+                columns["home_xGoals"].append(match["xG"][0])
+                columns["away_xGoals"].append(match["xG"][1])
+                for key in ["date", "opponent", "team_side", "match_result"]:
+                    columns[key].append(match[key])
+            else:
+                unplayed.append(
+                    {key: match[key] for key in ["date", "opponent", "team_side"]}
+                )
+            element.clear()  # the container is done, free it
+
+    played = {
+        "match_id": np.array(columns["match_id"], dtype=int),
+        "position": np.array(columns["position"], dtype=int),
+        "date": pd.to_datetime(columns["date"], format="%b %d, %Y").to_numpy(),
+        "opponent": np.array(columns["opponent"], dtype=object),
+        "team_side": np.array(columns["team_side"], dtype=object),
+        "match_result": np.array(columns["match_result"], dtype=object),
+        "home_xGoals": np.array(columns["home_xGoals"], dtype=float),
+        "away_xGoals": np.array(columns["away_xGoals"], dtype=float),
+    }
+
+    return Calendar(played, unplayed)
@@ -0,0 +1,250 @@
+"""
+Player-season index: one row per player, team and season of the cache, in the
+`player_seasons` table of the cache store.
+
+It is built from the players tables, all of their rows (the team charts only
+keep 15 players), and kept up to date incrementally: a team season is only
+read again when its players table changed. Queries are indexed SQL, no HTML
+is read at request time.
+
+Players are searched by name through `player_tokens`, an inverted index of the
+normalized words of their names (no accents, lower case). Players are known by
+their understat name only: two namesakes share one career.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+import config
+from cache_store import STORE, CacheStore
+from parsers import parse_understat_table
+
+# players table header -> index column
+COLUMNS = {
+    "Player": "player",
+    "Pos": "position",
+    "Apps": "apps",
+    "Min": "minutes",
+    "G": "G",
+    "A": "A",
+    "Sh90": "Sh90",
+    "KP90": "KP90",
+    "xG": "xG",
+    "xA": "xA",
+    "xG90": "xG90",
+    "xA90": "xA90",
+}
+INDEX_COLUMNS = ["league", "year", "team", *COLUMNS.values(), "diff_xG", "diff_xA"]
+NUMERIC_COLUMNS = [
+    column
+    for column in INDEX_COLUMNS
+    if column not in ["league", "team", "player", "position"]
+]
+# apostrophes are dropped (N'Golo -> ngolo), other non alphanumerics split words
+APOSTROPHE_REGEX = re.compile(r"['’`]")
+WORD_REGEX = re.compile(r"[a-z0-9]+")
+
+
+def get_name_tokens(name: str) -> List[str]:
+    """Words of a name without accents nor case,
+    e.g. "N'Golo Kanté" -> ["ngolo", "kante"]"""
+    ascii_name = (
+        unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    )
+    return WORD_REGEX.findall(APOSTROPHE_REGEX.sub("", ascii_name.lower()))
+
+
+def make_player_seasons(html_table: str, team: str, year: int, league: str):
+    """All the rows of a players table, with the index columns"""
+    df_players = parse_understat_table(html_table)[list(COLUMNS)].rename(
+        columns=COLUMNS
+    )
+    df_players["diff_xG"] = df_players["G"] - df_players["xG"]
+    df_players["diff_xA"] = df_players["A"] - df_players["xA"]
+    df_players.insert(0, "league", league)
+    df_players.insert(1, "year", year)
+    df_players.insert(2, "team", team)
+
+    return df_players
+
+
+def get_team_leagues(store: CacheStore) -> Dict[Tuple[str, int], str]:
+    """{(team, year): league}, read from the league tables of the cache,
+    or from config.COUNTRY_TEAMS when the league table is missing"""
+    config_leagues = {
+        team: config.COUNTRY_LEAGUES[country]
+        for country, teams in config.COUNTRY_TEAMS.items()
+        for team in teams[1:]
+    }
+    leagues = {
+        (team, year): config_leagues.get(team)
+        for team, year, _ in store.versions("players")
+    }
+    leagues.update(
+        ((team, year), league)
+        for league, year, team in store.connection.execute(
+            "SELECT league, year, team FROM league_teams"
+        )
+    )
+
+    return leagues
+
+
+def build_player_index(store: CacheStore = STORE) -> Tuple[int, dict]:
+    """Indexes the players tables that changed since the last build, returns
+    the number of indexed team seasons and the failures {(team, year): error}"""
+    if store.archive_path is not None:
+        store.import_archive()
+
+    connection = store.connection
+    indexed = {
+        (team, year): version
+        for team, year, version in connection.execute(
+            "SELECT team, year, version FROM player_index_sources"
+        )
+    }
+    leagues = get_team_leagues(store)
+
+    n_indexed, errors = 0, dict()
+    for team, year, version in store.versions("players"):
+        if indexed.get((team, year)) == version:
+            continue
+
+        try:
+            df_players = make_player_seasons(
+                store.read(team, year, "players"), team, year, leagues[(team, year)]
+            )
+        except (KeyError, ValueError) as error:  # e.g. a failed scrape
+            errors[(team, year)] = repr(error)
+            continue
+
+        with connection:
+            connection.execute(
+                "DELETE FROM player_seasons WHERE team = ? AND year = ?", (team, year)
+            )
+            connection.executemany(
+                f"INSERT INTO player_seasons ({', '.join(INDEX_COLUMNS)})"
+                f" VALUES ({', '.join('?' * len(INDEX_COLUMNS))})",
+                # object dtype: numpy ints can't be bound by sqlite3
+                df_players[INDEX_COLUMNS].astype(object).itertuples(index=False),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO player_index_sources VALUES (?, ?, ?)",
+                (team, year, version),
+            )
+        n_indexed += 1
+
+    index_player_names(store)
+
+    return n_indexed, errors
+
+
+def index_player_names(store: CacheStore = STORE) -> int:
+    """Adds the players of the index missing from `player_tokens`, returns
+    their number"""
+    connection = store.connection
+    players = [
+        player
+        for player, in connection.execute(
+            "SELECT DISTINCT player FROM player_seasons"
+            " WHERE player NOT IN (SELECT player FROM player_tokens)"
+        )
+    ]
+    with connection:
+        connection.executemany(
+            "INSERT OR IGNORE INTO player_tokens VALUES (?, ?)",
+            [
+                (token, player)
+                for player in players
+                for token in get_name_tokens(player)
+            ],
+        )
+
+    return len(players)
+
+
+def search_players(
+    query: str, limit: int = 20, store: CacheStore = STORE
+) -> List[Tuple[str, int, int, int, str]]:
+    """Players whose name has a word starting with each word of `query`
+    (e.g. "mbap" or "kylian mbappe"), as (player, number of seasons, first
+    season, last season, teams), the most played first"""
+    tokens = get_name_tokens(query)
+    if not tokens:
+        return []
+
+    # one range scan of the token primary key per word: "\uffff" sorts last
+    matches = " INTERSECT ".join(
+        ["SELECT player FROM player_tokens WHERE token >= ? AND token < ?"]
+        * len(tokens)
+    )
+    params = [bound for token in tokens for bound in (token, f"{token}\uffff")]
+
+    return store.connection.execute(
+        f"""
+        SELECT player, COUNT(*), MIN(year), MAX(year), GROUP_CONCAT(DISTINCT team)
+        FROM player_seasons
+        WHERE player IN ({matches})
+        GROUP BY player
+        ORDER BY SUM(minutes) DESC
+        LIMIT ?
+        """,
+        (*params, limit),
+    ).fetchall()
+
+
+def get_player_career(player: str, store: CacheStore = STORE) -> pd.DataFrame:
+    """All the seasons of a player, in every team, oldest first"""
+    return query_players(
+        player=player, order_by="year", ascending=True, limit=None, store=store
+    )
+
+
+def query_players(
+    league: str = None,
+    years: Tuple[int, int] = (None, None),
+    team: str = None,
+    player: str = None,
+    min_values: Dict[str, float] = None,
+    order_by: str = "diff_xG",
+    ascending: bool = False,
+    limit: int = 20,
+    store: CacheStore = STORE,
+) -> pd.DataFrame:
+    """Player seasons matching all the given filters, e.g.
+    - top 20 by G - xG in Serie A 2019:
+        query_players(league="Serie_A", years=(2019, 2019))
+    - all players with xA >= 5 since 2014:
+        query_players(years=(2014, None), min_values={"xA": 5}, limit=None)"""
+    conditions, params = [], []
+    for condition, value in [
+        ("league = ?", league),
+        ("year >= ?", years[0]),
+        ("year <= ?", years[1]),
+        ("team = ?", team),
+        ("player = ?", player),
+    ]:
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+
+    for column, value in (min_values or dict()).items():
+        if column not in NUMERIC_COLUMNS:
+            raise AttributeError(f"No such column {column}")
+        conditions.append(f"{column} >= ?")
+        params.append(value)
+
+    if order_by not in INDEX_COLUMNS:
+        raise AttributeError(f"No such column {order_by}")
+
+    query = "SELECT * FROM player_seasons"
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    query += f" ORDER BY {order_by} {'ASC' if ascending else 'DESC'}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    return pd.read_sql_query(query, store.connection, params=params)
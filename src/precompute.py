@@ -0,0 +1,190 @@
+"""
+Batch parsing of the whole cache into the parsed tier.
+
+Every table of the cache store goes through its parser (see utils.PARSERS) in a
+process pool, and the result is written where the app looks for it: a deployed
+app starts with everything already parsed, and a parser change (bump
+config.PARSERS_VERSION) is re-derived in one run. Run it from the root of the
+repo:
+
+    python src/precompute.py [--stats matches league] [--workers 4] [--force]
+
+Tables whose parsed version is up to date are skipped, and the table of all the
+league seasons of the Europe view is rebuilt along with the league tables. The
+timings and failures of each table are written to --report, one json line per
+table.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional, Tuple
+
+from tqdm import tqdm
+
+import config
+
+# batch run: nothing is read twice, memoization would only cost hashing
+config.MEMOIZE = False
+
+# pylint:disable=wrong-import-position
+import parsed_cache  # noqa: E402
+from cache_store import STORE  # noqa: E402
+from utils import PARSERS, get_europe_table  # noqa: E402
+
+REPORT_PATH = os.path.join(config.PARSED_CACHE_PATH, "precompute_report.jsonl")
+
+
+def precompute_table(
+    key: str, fingerprint: bytes, stats: str, html: str, compression: str
+) -> Tuple[float, float, int, Optional[str]]:
+    """Parses and writes one table, in a worker. Returns the parse and write
+    durations, the number of rows and the error if any"""
+    parse_seconds = write_seconds = 0.0
+    try:
+        start = time.perf_counter()
+        df_parsed = PARSERS[stats](html)
+        parse_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parsed_cache.write_parsed(key, fingerprint, df_parsed, compression)
+        write_seconds = time.perf_counter() - start
+    except Exception as error:  # pylint:disable=broad-except
+        return parse_seconds, write_seconds, 0, repr(error)
+
+    return parse_seconds, write_seconds, len(df_parsed), None
+
+
+def precompute(
+    list_stats: list,
+    workers: int = None,
+    force: bool = False,
+    compression: str = config.PARSED_COMPRESSION,
+) -> Tuple[list, int]:
+    """Parses the tables of `list_stats` that are not up to date in the parsed
+    tier (all of them with force=True). Returns one report dict per parsed
+    table, and the number of skipped tables"""
+    STORE.import_archive()
+
+    todo, skipped = [], 0
+    for stats in list_stats:
+        for entity, year, version in STORE.versions(stats):
+            key = parsed_cache.get_table_key(entity, year, stats)
+            fingerprint = version.encode()
+            if not force and parsed_cache.is_fresh(key, fingerprint):
+                skipped += 1
+                continue
+            todo.append((key, fingerprint, stats, entity, year))
+
+    report = []
+    # the raw tables are read here: the workers don't touch the sqlite store
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                precompute_table,
+                key,
+                fingerprint,
+                stats,
+                STORE.read(entity, year, stats),
+                compression,
+            ): (key, stats)
+            for key, fingerprint, stats, entity, year in todo
+        }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            key, stats = futures[future]
+            parse_seconds, write_seconds, n_rows, error = future.result()
+            report.append(
+                {
+                    "key": key,
+                    "stats": stats,
+                    "parse_ms": round(parse_seconds * 1000, 3),
+                    "write_ms": round(write_seconds * 1000, 3),
+                    "rows": n_rows,
+                    "error": error,
+                }
+            )
+
+    if "league" in list_stats:
+        get_europe_table()  # rebuilt only if a league table changed
+
+    return report, skipped
+
+
+def print_summary(report: list, skipped: int, seconds: float):
+    failures = [row for row in report if row["error"] is not None]
+    print(
+        f"{len(report) - len(failures)} table(s) parsed, {skipped} up to date, "
+        f"{len(failures)} failed, in {seconds:.1f}s"
+    )
+
+    for stats in sorted({row["stats"] for row in report}):
+        rows = [row for row in report if row["stats"] == stats]
+        print(
+            f"{stats:>10}: {len(rows)} table(s) | "
+            f"parse {sum(row['parse_ms'] for row in rows) / 1000:.2f}s | "
+            f"write {sum(row['write_ms'] for row in rows) / 1000:.2f}s"
+        )
+
+    slowest = sorted(report, key=lambda row: row["parse_ms"], reverse=True)[:5]
+    if slowest:
+        print(
+            "slowest: "
+            + ", ".join(f"{r['key']} {r['parse_ms']:.0f}ms" for r in slowest)
+        )
+    for row in failures:
+        print(f"unable to parse {row['key']}: {row['error']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parse the whole xG Tracker cache")
+    parser.add_argument(
+        "--stats",
+        nargs="+",
+        choices=list(PARSERS),
+        default=list(PARSERS),
+        help="tables to parse (default: all)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="also parse the tables whose parsed version is up to date",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=["uncompressed", "lz4", "zstd"],
+        default=config.PARSED_COMPRESSION,
+        help="compression of the parsed tables",
+    )
+    parser.add_argument(
+        "--report",
+        default=REPORT_PATH,
+        help="json lines report of the parsed tables",
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    start = time.time()
+    report, skipped = precompute(
+        args.stats, workers=args.workers, force=args.force, compression=args.compression
+    )
+    print_summary(report, skipped, time.time() - start)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w") as report_file:
+        for row in report:
+            report_file.write(json.dumps(row) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Standalone refresh service: populates the cache outside of the app.
+
+The app only reads the cache, this script owns the scraping. Run it once
+(`python src/refresh.py`) or keep it running on its own schedule
+(`python src/refresh.py --daemon`), from the root of the repo.
+"""
+import argparse
+import time
+from typing import List
+
+import config
+import metrics
+from async_fetch import update_db_async
+from cache_store import STORE, TEAM_STATS
+from driver_pool import DRIVER_POOL
+from player_index import build_player_index
+from scraping import invalidate_team, update_db
+
+ALL_STATS = TEAM_STATS + ["league"]
+
+
+def refresh_cache(
+    list_years: List,
+    list_stats: List,
+    workers: int = config.REFRESH_WORKERS,
+    executor: str = "thread",
+    delta: bool = False,
+    force: bool = False,
+) -> dict:
+    """Refreshes the stale entries, or all of them with force=True. Returns the
+    failures as {(stats, name, year): error}, stats being
+    'team' (players, statistics and matches at once) or 'league'.
+    With delta=True, only the teams with newly played matches are rewritten,
+    and only their parsed tables and charts are dropped"""
+    all_teams = [team for teams in config.COUNTRY_TEAMS.values() for team in teams[1:]]
+    all_teams = list(dict.fromkeys(all_teams))  # drop duplicates, keep order
+
+    # the three team tables come from the same page: one pass refreshes them all
+    passes = dict()
+    if set(list_stats) & set(TEAM_STATS):
+        passes["team"] = all_teams
+    if "league" in list_stats:
+        passes["league"] = list(config.COUNTRY_LEAGUES.values())
+
+    start = time.time()
+    errors = dict()
+    for stats, names in passes.items():
+        if executor == "async":
+            failed = update_db_async(
+                names,
+                list_years,
+                stats=stats,
+                workers=workers,
+                delta=delta,
+                force=force,
+            )
+        else:
+            failed = update_db(
+                names,
+                list_years,
+                stats=stats,
+                workers=workers,
+                executor=executor,
+                delta=delta,
+                force=force,
+            )
+        for (name, year), error in failed.items():
+            errors[(stats, name, year)] = error
+
+    if delta:
+        changes = STORE.changes_since(start)
+        for team, year, match_ids in changes:
+            invalidate_team(team, year)
+            print(f"{team}-{year}: {len(match_ids)} new match(es)")
+        print(f"{len(changes)} calendar(s) changed")
+
+    return errors
+
+
+def update_player_index():
+    n_indexed, errors = build_player_index()
+    print(f"player index: {n_indexed} team season(s) indexed, {len(errors)} failed")
+    for (team, year), error in errors.items():
+        print(f"unable to index {team}-{year}: {error}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Refresh the xG Tracker cache")
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+        default=[config.UPDATE_YEAR],
+        help="seasons to refresh (default: current season)",
+    )
+    parser.add_argument(
+        "--stats",
+        nargs="+",
+        choices=ALL_STATS,
+        default=ALL_STATS,
+        help="tables to refresh (default: all)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of concurrent workers (default: config.REFRESH_WORKERS); "
+        "threads share config.DRIVER_POOL_SIZE browsers, processes have "
+        "their own; or number of pages loading at once with "
+        "--executor async (default: config.ASYNC_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=["thread", "process", "async"],
+        default="thread",
+        help="run the workers as threads or as processes, or fetch the pages "
+        "with asyncio (http backend only)",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="only rewrite the teams whose calendar has newly played matches",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="also refresh the entries that are not stale (see config.CACHE_TTL_HOURS)",
+    )
+    parser.add_argument(
+        "--build-index",
+        action="store_true",
+        help="update the player index from the cache store and exit",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="also serve the metrics on http://localhost:<port>/metrics",
+    )
+    parser.add_argument(
+        "--import-archive",
+        action="store_true",
+        help="import the tables of config.ARCHIVE_PATH into the cache store and exit",
+    )
+    parser.add_argument(
+        "--export-archive",
+        metavar="PATH",
+        help="write every table of the cache store to the archive PATH and exit "
+        "(e.g. config.ARCHIVE_PATH, to ship the refreshed tables with the repo)",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep running and refresh every --interval hours",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=config.REFRESH_INTERVAL_HOURS,
+        help="hours between two refreshes in daemon mode",
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.workers is None:
+        args.workers = config.REFRESH_WORKERS
+        if args.executor == "async":
+            args.workers = config.ASYNC_CONCURRENCY
+
+    if args.import_archive:
+        imported, skipped = STORE.import_archive()
+        print(f"imported {imported} table(s), skipped {skipped}")
+        return
+
+    if args.export_archive:
+        STORE.import_archive()  # the tables never read yet are kept too
+        print(f"exported {STORE.export_archive(args.export_archive)} table(s)")
+        return
+
+    if args.build_index:
+        update_player_index()
+        metrics.write_metrics("refresh")
+        return
+
+    if args.metrics_port is not None:
+        metrics.start_metrics_server(args.metrics_port)
+
+    while True:
+        start = time.time()
+        errors = refresh_cache(
+            args.years,
+            args.stats,
+            workers=args.workers,
+            executor=args.executor,
+            delta=args.delta,
+            force=args.force,
+        )
+        print(
+            f"cache refreshed in {time.time() - start:.0f}s, "
+            f"{len(errors)} failed update(s)"
+        )
+        metrics.observe("refresh_run", time.time() - start)
+        update_player_index()
+        metrics.write_metrics("refresh")
+
+        if not args.daemon:
+            break
+        DRIVER_POOL.close_idle()
+        time.sleep(args.interval * 3600)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Scraping and refresh of the cache: everything that talks to understat.
+
+Only the refresh service (refresh.py) imports it, and the app on a true cache
+miss (see utils.get_xG_html_table): serving pages from the cache never loads
+requests, BeautifulSoup, Selenium or tqdm.
+"""
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import List
+
+import requests
+from bs4 import BeautifulSoup
+from tqdm import tqdm
+
+import config
+import metrics
+import parsed_cache
+import understat_json
+from cache_store import STORE, TEAM_STATS
+from driver_pool import DRIVER_POOL
+from parsers import parse_calendar
+from rate_limiter import HostRateLimiter
+
+RATE_LIMITER = HostRateLimiter(config.REFRESH_RATE, config.REFRESH_BURST)
+
+
+def fetch_team_tables(name: str, year: int, delta: bool = False) -> dict:
+    """Loads the team page once and caches its players,
+    statistics and matches tables.
+    With delta=True, the cache is only rewritten if matches were played since
+    the cached calendar, and the new matches are logged in the store changes"""
+    tables = fetch_tables("team", name, year)
+    save_tables("team", name, year, tables, delta=delta)
+
+    return tables
+
+
+def fetch_league_tables(name: str, year: int) -> dict:
+    """Loads the league page and caches its table"""
+    tables = fetch_tables("league", name, year)
+    save_tables("league", name, year, tables)
+
+    return tables
+
+
+def save_tables(
+    mode: str, name: str, year: int, tables: dict, delta: bool = False
+) -> List[str]:
+    """Writes the tables of a 'team' or 'league' page to the cache, returns the
+    stats that changed. With delta=True, a team is only rewritten if matches
+    were played since the cached calendar, or if any of its tables is missing"""
+    new_matches = None
+    if delta and mode == "team":
+        new_matches = get_new_matches(
+            STORE.read(name, year, "matches"), tables["matches"]
+        )
+        is_cached = all(STORE.version(name, year, s) is not None for s in TEAM_STATS)
+        if is_cached and not new_matches:
+            STORE.touch(name, year, TEAM_STATS)
+            metrics.log("no_new_match", entity=name, year=year)
+            return []
+
+    with metrics.span("cache_write", stats=mode):
+        changed = STORE.write_tables(
+            name,
+            year,
+            tables,
+            source_url=get_page_url(mode, name, year),
+            new_matches=new_matches,
+        )
+    metrics.log(
+        "saved", entity=name, year=year, changed=changed, new_matches=new_matches
+    )
+
+    return changed
+
+
+def get_new_matches(cached_calendar: str, fresh_calendar: str) -> List[int]:
+    """Ids of the matches played in `fresh_calendar` but not in `cached_calendar`,
+    all the played ones if nothing usable is cached"""
+    fresh_ids = parse_calendar(fresh_calendar).played["match_id"]
+    cached_ids = set()
+    if cached_calendar:
+        cached_ids = set(parse_calendar(cached_calendar).played["match_id"])
+
+    return [int(match_id) for match_id in fresh_ids if match_id not in cached_ids]
+
+
+def invalidate_team(name: str, year: int):
+    """Drops the parsed tables and charts derived from the tables of a team,
+    instead of letting them wait for their next view to be rebuilt"""
+    for stats in TEAM_STATS:
+        parsed_cache.delete_parsed(parsed_cache.get_table_key(name, year, stats))
+    STORE.delete_charts(name, year)
+
+
+def fetch_tables(mode: str, name: str, year: int) -> dict:
+    """Returns the {stats: table_html} of a 'team' or 'league' page, read
+    from its json blobs with the http backend, or rendered by Selenium"""
+    if config.FETCH_BACKEND == "http":
+        try:
+            page_source = load_page_source(mode, name, year, backend="http")
+            return understat_json.tables_from_page(page_source, mode, year)
+        except (requests.RequestException, ValueError) as error:
+            metrics.increment("fetch_fallbacks", mode=mode)
+            metrics.log(
+                "http_fetch_failed",
+                logging.WARNING,
+                entity=name,
+                year=year,
+                error=error,
+            )
+
+    page_soup = BeautifulSoup(
+        load_page_source(mode, name, year, backend="selenium"), "lxml"
+    )
+    list_stats = TEAM_STATS if mode == "team" else ["league"]
+
+    return {stats: extract_table(page_soup, stats) for stats in list_stats}
+
+
+def get_page_url(mode: str, name: str, year: int) -> str:
+    return f"{config.UNDERSTAT_URL}/{mode}/{name}/{year}"
+
+
+def load_page_source(mode: str, name: str, year: int, backend: str) -> str:
+    """mode is 'team' or 'league', backend is 'http' or 'selenium'"""
+    url = get_page_url(mode, name, year)
+    with metrics.span("rate_limit_wait"):
+        RATE_LIMITER.acquire(url)
+
+    with metrics.span("fetch", backend=backend, mode=mode):
+        if backend == "http":
+            return understat_json.fetch_page(url)
+
+        with DRIVER_POOL.borrow() as driver:
+            driver.get(url)
+            return driver.page_source
+
+
+def extract_table(page_soup: BeautifulSoup, stats: str) -> str:
+    if stats in ["players", "statistics"]:
+        table_html = str(page_soup.find(
+            "div", {"id": f"team-{stats}"}).find("table"))
+    elif stats == "league":
+        table_html = str(page_soup.find(
+            "div", {"id": "league-chemp"}).find("table"))
+    elif stats == "matches":
+        table = page_soup.find("div", {"class": "calendar-container"})
+        if table is None:
+            raise AttributeError("No calendar in page")
+        table_html = str(table)
+    else:
+        raise AttributeError(f"No such stats {stats}")
+
+    return table_html
+
+
+def _init_refresh_worker(rate: float, burst: float):
+    """Each worker process has its own driver pool and its share of the rate
+    and burst"""
+    global RATE_LIMITER  # pylint:disable=global-statement
+    RATE_LIMITER = HostRateLimiter(rate, burst)
+
+
+def _refresh_one(team: str, year: int, stats: str, delta: bool, force: bool) -> bool:
+    """Returns False if the entry was skipped, being still fresh"""
+    # the team page holds the three team tables: it is stale if any of them is
+    list_stats = TEAM_STATS if stats in TEAM_STATS + ["team"] else [stats]
+    if not force and not any(STORE.is_stale(team, year, s) for s in list_stats):
+        return False
+
+    if list_stats == TEAM_STATS:
+        fetch_team_tables(team, year, delta=delta)
+    else:
+        fetch_league_tables(team, year)
+
+    return True
+
+
+def update_db(
+    list_teams: List,
+    list_years: List,
+    stats: str,
+    workers: int = config.REFRESH_WORKERS,
+    executor: str = "thread",
+    delta: bool = False,
+    force: bool = False,
+) -> dict:
+    """Refreshes every stale (team, year) with `workers` concurrent workers
+    ('thread' or 'process') and returns the failures as {(team, year): error}.
+    Threads share the config.DRIVER_POOL_SIZE browsers of DRIVER_POOL, each
+    process has its own pool. The rate limit and burst are split between the
+    processes.
+    stats='team' refreshes players, statistics and matches in one page load.
+    delta=True only rewrites the teams with newly played matches
+    (see fetch_team_tables), force=True also refreshes the fresh entries"""
+    if executor == "thread":
+        pool = ThreadPoolExecutor(workers)
+    elif executor == "process":
+        pool = ProcessPoolExecutor(
+            workers,
+            initializer=_init_refresh_worker,
+            initargs=(
+                config.REFRESH_RATE / workers,
+                max(config.REFRESH_BURST / workers, 1),
+            ),
+        )
+    else:
+        raise AttributeError(f"No such executor {executor}")
+
+    errors, n_skipped = dict(), 0
+    with pool:
+        futures = {
+            pool.submit(_refresh_one, team, year, stats, delta, force): (team, year)
+            for team, year in itertools.product(list_teams, list_years)
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc=stats):
+            try:
+                n_skipped += not future.result()
+            except Exception as error:  # pylint:disable=broad-except
+                errors[futures[future]] = repr(error)
+
+    metrics.increment("refresh_skipped", n_skipped, stats=stats)
+    metrics.increment("refresh_failures", len(errors), stats=stats)
+    metrics.log("refresh_done", stats=stats, skipped=n_skipped, failed=len(errors))
+
+    for (team, year), error in errors.items():
+        metrics.log(
+            "update_failed", logging.WARNING, entity=team, year=year, error=error
+        )
+
+    return errors
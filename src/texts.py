@@ -75,3 +75,43 @@ MEANING_DIFF_SHOTS = """**Ce graph représente la différence de qualité de tir
                             tir sera élevée, signe d'une vulnérabilité. Le différentiel 
                             est donc un outil pour évaluer la domination d'une 
                             équipe en fonction des situations de jeu. **"""
+
+MEANING_PLAYER_RANKING = """**Ce classement regroupe tous les joueurs de tous les 
+                            championnats et saisons du cache. Classés par buts - xG, 
+                            les premiers joueurs sont ceux qui ont le plus surperformé 
+                            leurs occasions, les derniers (ordre croissant) ceux qui 
+                            les ont le plus gâchées. **"""
+
+EMPTY_PLAYER_INDEX = """Aucun joueur ne correspond à cette recherche. Si l'index 
+                        des joueurs n'a pas encore été construit, lancer 
+                        `python src/refresh.py --build-index`."""
+
+MEANING_TRAJECTORY = """**Ce graph superpose les saisons de l'équipe : chaque ligne 
+                        est la moyenne glissante sur 6 matchs des xGoals produits 
+                        (en haut) ou concédés (en bas) au fil des journées. Cliquer 
+                        sur une saison dans la légende la masque. **"""
+
+NO_CACHED_SEASON = "Aucun calendrier de cette équipe n'est disponible dans le cache."
+
+PLAYER_SEARCH_HINT = """Taper le nom d'un joueur dans la barre latérale, ou le 
+                        début de son nom (par exemple "mbap" ou "kante", sans 
+                        accents ni majuscules)."""
+
+NO_PLAYER_FOUND = """Aucun joueur ne correspond à cette recherche. Si l'index 
+                     des joueurs n'a pas encore été construit, lancer 
+                     `python src/refresh.py --build-index`."""
+
+MEANING_PLAYER_CAREER = """**Ce graph suit le joueur sur toutes les saisons du cache, 
+                            une saison par équipe. Les lignes pleines sont les buts et 
+                            passes dé réels, les lignes pointillées les xGoals et 
+                            xAssists attendus : un joueur au-dessus de ses pointillés 
+                            a surperformé cette saison-là. **"""
+
+MEANING_EUROPE_GRAPH = """**Chaque point est une équipe sur une saison, tous 
+                            championnats confondus : les valeurs attendues (xGoals, 
+                            xPoints ou xGA) en abscisse, les valeurs réelles en 
+                            ordonnée, la couleur indiquant la ligue. Les équipes 
+                            au-dessus de la ligne noire ont surperformé. Zoomer 
+                            avec la molette, survoler un point pour voir l'équipe. **"""
+
+NO_CACHED_LEAGUE = "Aucun classement de ces ligues et saisons n'est disponible dans le cache."
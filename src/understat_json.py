@@ -0,0 +1,258 @@
+"""
+Browserless understat backend.
+
+Understat pages carry their data as `var xxxData = JSON.parse('...')` script
+blobs. This module fetches pages with plain HTTP requests, decodes those
+blobs into records and renders them as the same HTML tables the Selenium
+backend caches, so everything downstream (`process_*`) is unchanged.
+"""
+import json
+import re
+import threading
+from datetime import datetime
+from html import escape
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+
+JSON_BLOB_REGEX = re.compile(r"var\s+(\w+)\s*=\s*JSON\.parse\('(.*?)'\)", re.DOTALL)
+HEX_ESCAPE_REGEX = re.compile(rb"\\x([0-9A-Fa-f]{2})")
+
+SITUATIONS = {
+    "OpenPlay": "Open play",
+    "FromCorner": "From corner",
+    "DirectFreekick": "Direct Freekick",
+    "SetPiece": "Set piece",
+    "Penalty": "Penalty",
+}
+
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """One keep-alive session per thread, so connections are reused"""
+    if not hasattr(_local, "session"):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+
+    return _local.session
+
+
+def fetch_page(url: str) -> str:
+    response = get_session().get(url, timeout=config.HTTP_TIMEOUT)
+    response.raise_for_status()
+    response.encoding = "utf-8"
+
+    return response.text
+
+
+def decode_js_string(blob: str) -> str:
+    """Undoes the \\xHH escaping of understat blobs (escaped bytes are utf-8)"""
+    raw = HEX_ESCAPE_REGEX.sub(
+        lambda match: bytes([int(match.group(1), 16)]), blob.encode("utf-8")
+    )
+    return raw.decode("utf-8").replace("\\'", "'")
+
+
+def extract_json_blobs(page_source: str) -> dict:
+    """Returns {variable name: decoded json} for every blob of the page"""
+    return {
+        name: json.loads(decode_js_string(blob))
+        for name, blob in JSON_BLOB_REGEX.findall(page_source)
+    }
+
+
+def tables_from_page(page_source: str, mode: str, year: int) -> dict:
+    """Returns the {stats: table_html} entries to cache for a 'team'
+    or a 'league' page"""
+    blobs = extract_json_blobs(page_source)
+
+    try:
+        if mode == "team":
+            return {
+                "players": players_table_html(blobs["playersData"]),
+                "statistics": statistics_table_html(blobs["statisticsData"]),
+                "matches": calendar_html(blobs["datesData"], year),
+            }
+        if mode == "league":
+            return {"league": league_table_html(blobs["teamsData"], year)}
+    except KeyError as error:
+        raise ValueError(f"Missing data in {mode} page: {error!r}") from error
+
+    raise AttributeError(f"No such mode {mode}")
+
+
+def _per_90(value: float, minutes: float) -> float:
+    return value * 90 / minutes if minutes else 0
+
+
+def _expected_cell(expected: float, actual: float) -> str:
+    """understat shows the expected value and its gap to the actual one"""
+    return f"{expected:.2f}<sup>{expected - actual:+.2f}</sup>"
+
+
+def _table_html(headers: list, rows: list) -> str:
+    head = "".join(f"<th>{header}</th>" for header in headers)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>" for row in rows
+    )
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def players_table_html(players: list) -> str:
+    players = sorted(players, key=lambda player: -int(player["goals"]))
+
+    rows = []
+    for j, player in enumerate(players):
+        minutes = int(player["time"])
+        x_goals, x_assists = float(player["xG"]), float(player["xA"])
+        position = [pos for pos in player["position"].split() if pos != "S"]
+
+        rows.append(
+            [
+                j + 1,
+                escape(player["player_name"]),
+                " ".join(position) or "S",
+                player["games"],
+                minutes,
+                player["goals"],
+                player["assists"],
+                f"{_per_90(int(player['shots']), minutes):.2f}",
+                f"{_per_90(int(player['key_passes']), minutes):.2f}",
+                _expected_cell(x_goals, int(player["goals"])),
+                _expected_cell(x_assists, int(player["assists"])),
+                f"{_per_90(x_goals, minutes):.2f}",
+                f"{_per_90(x_assists, minutes):.2f}",
+            ]
+        )
+
+    headers = ["№", "Player", "Pos", "Apps", "Min", "G", "A",
+               "Sh90", "KP90", "xG", "xA", "xG90", "xA90"]
+    return _table_html(headers, rows)
+
+
+def statistics_table_html(statistics: dict) -> str:
+    situations = sorted(
+        statistics["situation"].items(), key=lambda item: -int(item[1]["shots"])
+    )
+
+    rows = []
+    for j, (situation, stats) in enumerate(situations):
+        shots, goals = int(stats["shots"]), int(stats["goals"])
+        shots_against = int(stats["against"]["shots"])
+        goals_against = int(stats["against"]["goals"])
+        x_goals = float(stats["xG"])
+        x_goals_against = float(stats["against"]["xG"])
+
+        rows.append(
+            [
+                j + 1,
+                SITUATIONS.get(situation, situation),
+                shots,
+                goals,
+                shots_against,
+                goals_against,
+                _expected_cell(x_goals, goals),
+                _expected_cell(x_goals_against, goals_against),
+                f"{x_goals - x_goals_against:.2f}",
+                f"{x_goals / shots if shots else 0:.2f}",
+                f"{x_goals_against / shots_against if shots_against else 0:.2f}",
+            ]
+        )
+
+    headers = ["№", "Situation", "Sh", "G", "ShA", "GA",
+               "xG", "xGA", "xGD", "xG/Sh", "xGA/Sh"]
+    return _table_html(headers, rows)
+
+
+def _team_link(title: str, year: int) -> str:
+    return f'<a href="team/{title.replace(" ", "_")}/{year}">{escape(title)}</a>'
+
+
+def _xg_span(side: str, x_goals: str) -> str:
+    units, decimals = f"{float(x_goals):.2f}".split(".")
+    return f'<span class="team-{side}">{units}.<small>{decimals}</small></span>'
+
+
+def calendar_html(dates: list, year: int) -> str:
+    containers = []
+    for match in dates:
+        side = match["side"]
+        opponent = match["a" if side == "h" else "h"]["title"]
+        date = datetime.strptime(match["datetime"], "%Y-%m-%d %H:%M:%S")
+
+        if match["isResult"]:
+            result = f' data-result="{match["result"]}"'
+            info = (
+                f'<a class="match-info" data-isresult="true" href="match/{match["id"]}">'
+                '<div class="teams-goals">'
+                f'<span class="team-home">{match["goals"]["h"]}</span>'
+                f'<span class="team-away">{match["goals"]["a"]}</span></div>'
+                '<div class="teams-xG">'
+                f'{_xg_span("home", match["xG"]["h"])}{_xg_span("away", match["xG"]["a"])}'
+                "</div></a>"
+            )
+        else:
+            result = ""
+            info = (
+                '<div class="match-info" data-isresult="false">'
+                f'<div class="match-time">{date:%H:%M}</div></div>'
+            )
+
+        containers.append(
+            '<div class="calendar-date-container mini">'
+            f'<div class="calendar-date"{result} data-side="{side}">{date:%b %d, %Y}</div>'
+            '<div class="calendar-games"><div class="calendar-game">'
+            f'{info}<div class="team-title">{_team_link(opponent, year)}</div>'
+            "</div></div></div>"
+        )
+
+    return f'<div class="calendar-container">{"".join(containers)}</div>'
+
+
+def league_table_html(teams: dict, year: int) -> str:
+    totals = []
+    for team in teams.values():
+        history = team["history"]
+        totals.append(
+            {
+                "title": team["title"],
+                "M": len(history),
+                "W": sum(int(match["wins"]) for match in history),
+                "D": sum(int(match["draws"]) for match in history),
+                "L": sum(int(match["loses"]) for match in history),
+                "G": sum(int(match["scored"]) for match in history),
+                "GA": sum(int(match["missed"]) for match in history),
+                "PTS": sum(int(match["pts"]) for match in history),
+                "xG": sum(float(match["xG"]) for match in history),
+                "xGA": sum(float(match["xGA"]) for match in history),
+                "xPTS": sum(float(match["xpts"]) for match in history),
+            }
+        )
+    totals.sort(key=lambda team: (-team["PTS"], team["GA"] - team["G"]))
+
+    rows = [
+        [
+            j + 1,
+            _team_link(team["title"], year),
+            team["M"],
+            team["W"],
+            team["D"],
+            team["L"],
+            team["G"],
+            team["GA"],
+            team["PTS"],
+            _expected_cell(team["xG"], team["G"]),
+            _expected_cell(team["xGA"], team["GA"]),
+            _expected_cell(team["xPTS"], team["PTS"]),
+        ]
+        for j, team in enumerate(totals)
+    ]
+
+    headers = ["№", "Team", "M", "W", "D", "L", "G", "GA", "PTS", "xG", "xGA", "xPTS"]
+    return _table_html(headers, rows)
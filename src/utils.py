@@ -1,98 +1,108 @@
 # pylint: disable=too-many-function-args,invalid-name,missing-function-docstring
 
 import itertools
-import os
-import re
-from typing import List
+import json
+from typing import Callable, Dict, List, Tuple
 
+import bokeh
+import numpy as np
 import pandas as pd
 import streamlit as st
-from bokeh.layouts import row
+import streamlit.components.v1 as components
+from bokeh.embed import json_item
+from bokeh.layouts import column, row
 from bokeh.models import (
     CategoricalColorMapper,
     CategoricalTicker,
     ColorBar,
+    Column,
     ColumnDataSource,
     FactorRange,
     LinearColorMapper,
 )
 from bokeh.models.tools import HoverTool
-from bokeh.palettes import RdYlGn
+from bokeh.palettes import Category10, RdYlGn, viridis
 from bokeh.plotting import figure
 from bokeh.plotting.figure import Figure
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from tqdm import tqdm
+from bokeh.resources import CDN
 
 import config
+import metrics
+import parsed_cache
+from cache_store import STORE, TEAM_STATS, CacheStore
+from parsers import CALENDAR_COLUMNS, parse_calendar, parse_understat_table
 
 
-def get_driver():
-    if "DYNO" in os.environ:  # if in heroku env
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.binary_location = os.environ.get(
-            "GOOGLE_CHROME_SHIM", None)
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
+def memoize(func):
+    """Memoizes `func` across Streamlit reruns, keyed on the content of its
+    arguments, keeping the config.MEMO_MAX_ENTRIES most recently used results"""
+    if not config.MEMOIZE:
+        return func
 
-    else:  # if in local env
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-
-    driver = webdriver.Chrome(
-        options=chrome_options, executable_path=config.CHROMEDRIVER_PATH
-    )
-
-    return driver
+    return st.cache(
+        max_entries=config.MEMO_MAX_ENTRIES,
+        show_spinner=False,
+        allow_output_mutation=True,  # results are shared, never modify them
+        hash_funcs={CacheStore: lambda store: store.db_path},
+    )(func)
 
 
 def get_xG_html_table(
     name: str, year: int, force_update: bool = False, stats: str = "players"
 ):
     """stats is 'players' or 'statistics' or 'league' or 'matches'"""
-    path_name = os.path.join(config.CACHE_PATH, f"{name}_{year}_{stats}.txt")
-
     # try cache
-    if os.path.exists(path_name) and not force_update:
-        print("used cache")
-        with open(path_name) as cache_text:
-            table_html = cache_text.read().replace("\n", "")
-        return table_html
-
-    driver = get_driver()
-
-    mode = "team" if stats in ["players",
-                               "statistics", "matches"] else "league"
-
-    driver.get(f"https://understat.com/{mode}/{name}/{year}")
-    team_soup = BeautifulSoup(driver.page_source, "lxml")
-
-    if stats in ["players", "statistics"]:
-        table_html = str(team_soup.find(
-            "div", {"id": f"team-{stats}"}).find("table"))
-    elif stats == "league":
-        table_html = str(team_soup.find(
-            "div", {"id": "league-chemp"}).find("table"))
-    elif stats == "matches":
-        table_html = str(team_soup.find(
-            "div", {"class": "calendar-container"}))
-
-    driver.quit()
-
-    with open(path_name, "w+") as cache_text:
-        print(f"saved file for {name}-{year}")
-        cache_text.write(table_html)
-
-    return table_html
+    if not force_update:
+        with metrics.span("cache_read", stats=stats):
+            table_html = STORE.read(name, year, stats)
+        metrics.increment(
+            "cache_requests",
+            stats=stats,
+            result="miss" if table_html is None else "hit",
+        )
+        if table_html is not None:
+            return table_html
+
+    # a true cache miss: only now is the scraping code loaded
+    import scraping  # pylint:disable=import-outside-toplevel
+
+    if stats in TEAM_STATS:
+        # the team page holds the three tables, cache them all at once
+        return scraping.fetch_team_tables(name, year)[stats]
+
+    return scraping.fetch_league_tables(name, year)[stats]
+
+
+def get_processed_table(
+    name: str, year: int, stats: str = "players", force_update: bool = False
+) -> pd.DataFrame:
+    """Processed DataFrame of a cache entry (see PARSERS), served from the
+    parsed cache tier unless the raw table changed since it was parsed"""
+    version = None if force_update else STORE.version(name, year, stats)
+    if version is None:
+        get_xG_html_table(name, year, force_update=True, stats=stats)
+        version = STORE.version(name, year, stats)
+
+    return _load_processed_table(name, year, stats, version)
+
+
+@memoize
+def _load_processed_table(
+    name: str, year: int, stats: str, version: str
+) -> pd.DataFrame:
+    """version (the content hash of the table) is only part of the
+    memoization key: a changed table is read again"""
+    return parsed_cache.get_parsed_table(
+        parsed_cache.get_table_key(name, year, stats),
+        version.encode(),
+        lambda: STORE.read(name, year, stats),
+        PARSERS[stats],
+    )
 
 
+@memoize
 def process_html(html_table: str, mode: str = "A"):
-    df_team = pd.read_html(html_table)[0].drop("№", axis=1).iloc[:15]
-
-    for col in ["xG", f"x{mode}"]:
-        df_team[col] = df_team[col].str.split(
-            r"\+|\-").apply(lambda x: float(x[0]))
+    df_team = parse_understat_table(html_table).drop("№", axis=1).iloc[:15]
 
     df_team["diff_xG"] = df_team["G"] - df_team["xG"]
     df_team[f"diff_x{mode}"] = df_team[f"{mode}"] - df_team[f"x{mode}"]
@@ -322,13 +332,52 @@ def make_quality_shot_chart(
     return fig
 
 
-def update_db(list_teams: List, list_years: List, stats: str):
-    for team, year in tqdm(itertools.product(list_teams, list_years)):
-        #get_xG_html_table(team, year, force_update=True, stats=stats)
-        try:
-            get_xG_html_table(team, year, force_update=True, stats=stats)
-        except AttributeError:  # pylint:disable=bare-except
-            print(f"unable to update {team}-{year}")
+def show_cached_chart(chart_key: Tuple, sources: List[Tuple], build_chart: Callable):
+    """Displays the chart identified by `chart_key` (e.g. entity, year, mode,
+    options). `build_chart` is only called when no serialized version of the
+    chart was cached for the current versions of the `sources` tables
+    (name, year, stats)"""
+    key = "/".join(str(part) for part in chart_key)
+
+    def get_fingerprint():
+        versions = "-".join(str(STORE.version(*source)) for source in sources)
+        return f"{versions}-{bokeh.__version__}"
+
+    kind = chart_key[0]
+    with metrics.span("chart_cache_read", kind=kind):
+        cached = STORE.read_chart(key, get_fingerprint())
+    metrics.increment(
+        "chart_cache_requests", kind=kind, result="miss" if cached is None else "hit"
+    )
+    if cached is None:
+        with metrics.span("chart_build", kind=kind):
+            chart = build_chart()  # may fetch the source table
+            cached = json.dumps(json_item(chart)), get_chart_height(chart)
+        STORE.write_chart(key, get_fingerprint(), *cached)
+
+    with metrics.span("render", kind=kind):
+        show_chart(*cached)
+
+
+def get_chart_height(chart) -> int:
+    if isinstance(chart, Column):
+        return sum(get_chart_height(child) for child in chart.children)
+    if hasattr(chart, "children"):  # row layout
+        return max(get_chart_height(child) for child in chart.children)
+
+    return chart.plot_height
+
+
+def show_chart(chart_item: str, height: int):
+    """Renders a chart serialized by bokeh.embed.json_item"""
+    components.html(
+        f"""
+        {CDN.render_js()}
+        <div id="chart"></div>
+        <script>Bokeh.embed.embed_item({chart_item}, "chart");</script>
+        """,
+        height=height + 20,
+    )
 
 
 def make_sidebar():
@@ -340,7 +389,14 @@ def make_sidebar():
 
     team_mode = st.sidebar.selectbox(
         "Mode ? (par ligue ou par équipe)",
-        ("<Choix du mode>", "Par ligue", "Par équipe"),
+        (
+            "<Choix du mode>",
+            "Par ligue",
+            "Par équipe",
+            "Classement des joueurs",
+            "Carrière d'un joueur",
+            "Europe",
+        ),
     )
 
     if team_mode == "Par équipe":
@@ -352,6 +408,11 @@ def make_sidebar():
     else:
         team_choice = st.text("")
 
+    if team_mode == "Carrière d'un joueur":
+        player_query = st.sidebar.text_input("Quel joueur veux-tu analyser ?")
+    else:
+        player_query = ""
+
     year_choice = st.sidebar.selectbox(
         "Quelle année veux-tu analyser ?", config.LIST_OF_YEARS, index=0
     )
@@ -372,26 +433,28 @@ def make_sidebar():
     shots_quality_options = st.sidebar.checkbox(
         "Montrer la qualité des tirs", value=True
     )
+    trajectory_options = st.sidebar.checkbox(
+        "Montrer la trajectoire sur toutes les saisons", value=False
+    )
 
-    parameters = country_choice, team_choice, year_choice, team_mode
+    parameters = country_choice, team_choice, year_choice, team_mode, player_query
     analysis = (
         goal_options,
         assist_options,
         situations_options,
         shots_quality_options,
         top_players_options,
+        trajectory_options,
     )
 
     return parameters, analysis
 
 
+@memoize
 def process_html_league(html_league_table: str):
-    df_league = pd.read_html(str(html_league_table))[0]
+    df_league = parse_understat_table(html_league_table)
 
     for col in ["xG", "xGA", "xPTS"]:
-        df_league[col] = df_league[col].str.split(
-            "[+-]", expand=True)[0].astype(float)
-
         df_league[f"diff_{col}"] = df_league[col[1:]] - df_league[col]
 
     df_league["theoretical_rank"] = df_league["xPTS"].rank(ascending=False)
@@ -516,6 +579,132 @@ def plot_xG_league(
     return fig
 
 
+def get_europe_table(years: List[int] = config.LIST_OF_YEARS) -> pd.DataFrame:
+    """League tables of every league of config.COUNTRY_LEAGUES over the cached
+    seasons among `years`, one row per team season, see make_europe_df"""
+    # STORE.version imports the tables missing from the store (from their text
+    # files), STORE.versions would only list the ones imported already
+    versions = (
+        (league, year, STORE.version(league, year, "league"))
+        for league in config.COUNTRY_LEAGUES.values()
+        for year in years
+    )
+    versions = tuple(entry for entry in versions if entry[2] is not None)
+
+    return _load_europe_table(versions)
+
+
+@memoize
+def _load_europe_table(versions: Tuple) -> pd.DataFrame:
+    """versions ((league, year, version) of each table) is only part of the
+    memoization key: the table is built again when a league table changed"""
+    return parsed_cache.get_parsed_table(
+        "europe_league",
+        repr(versions).encode(),
+        lambda: {
+            (league, year): STORE.read(league, year, "league")
+            for league, year, _ in versions
+        },
+        make_europe_df,
+    )
+
+
+def make_europe_df(league_tables: Dict[Tuple[str, int], str]) -> pd.DataFrame:
+    """The processed league tables {(league, year): html} in one DataFrame, with
+    'league', 'year' and 'season' columns"""
+    df_leagues = [
+        process_html_league(html).assign(
+            league=league, year=year, season=f"{year}-{year + 1}"
+        )
+        for (league, year), html in sorted(league_tables.items())
+    ]
+    if not df_leagues:
+        return pd.DataFrame(columns=["league", "year", "season", "Team"])
+
+    return pd.concat(df_leagues, ignore_index=True)
+
+
+def plot_xG_europe(df_europe: pd.DataFrame, mode: str = "G") -> Figure:
+    """Real vs expected goals (G), points (PTS) or goals against (GA) of every
+    team season of `df_europe` (see get_europe_table), colored by league.
+    Drawn with WebGL: panning and hovering stay fluid with hundreds of points"""
+    if mode == "G":
+        full_mode = "Goal"
+    elif mode == "GA":
+        full_mode = "GoalAgainst"
+    elif mode == "PTS":
+        full_mode = "Points"
+    else:
+        raise AttributeError(f"No such mode {mode}")
+
+    k_offset = 5
+    plot_max = max(df_europe[f"x{mode}"].max(), df_europe[mode].max()) + k_offset
+    plot_min = min(df_europe[f"x{mode}"].min(), df_europe[mode].min()) - k_offset
+
+    leagues = sorted(config.COUNTRY_LEAGUES.values())
+    color_mapper = CategoricalColorMapper(
+        factors=leagues, palette=Category10[10][: len(leagues)]
+    )
+
+    fig = figure(
+        title=f"x{full_mode} vs. vrais {full_mode}, toutes ligues et saisons",
+        y_range=(plot_min, plot_max),
+        x_range=(plot_min, plot_max),
+        plot_width=900,
+        plot_height=700,
+        output_backend="webgl",
+        tools="pan,wheel_zoom,box_zoom,reset",
+        active_scroll="wheel_zoom",
+    )
+
+    fig.xaxis.axis_label = f"x{full_mode}"
+    fig.yaxis.axis_label = f"{full_mode}"
+    fig.xaxis.axis_label_text_font_size = "16pt"
+    fig.yaxis.axis_label_text_font_size = "16pt"
+    fig.xaxis.major_label_text_font_size = "12pt"
+    fig.yaxis.major_label_text_font_size = "12pt"
+
+    fig.line(
+        [0, plot_max],
+        [0, plot_max],
+        color="black",
+        legend_label="Performance normale",
+        line_width=2,
+    )
+
+    points = fig.circle(
+        x=f"x{mode}",
+        y=mode,
+        source=ColumnDataSource(df_europe),
+        size=9,
+        fill_alpha=0.7,
+        line_color="black",
+        line_width=0.5,
+        color={"field": "league", "transform": color_mapper},
+        legend_field="league",
+    )
+
+    fig.background_fill_color = "gray"
+    fig.background_fill_alpha = 0.05
+
+    # the hover only tests the points, not the diagonal
+    hover = HoverTool(renderers=[points])
+    hover.tooltips = [
+        ("", "@Team"),
+        ("Ligue", "@league"),
+        ("Saison", "@season"),
+        (f"x{mode}", f"@x{mode}{{0.2f}}"),
+        (mode, f"@{mode}{{0.2f}}"),
+        (f"Diff. x{mode} vs {mode}", f"@diff_x{mode}{{0.2f}}"),
+    ]
+    fig.add_tools(hover)
+
+    fig.legend.location = "top_left"
+    fig.toolbar.logo = None
+
+    return fig
+
+
 def make_croqueurs_killers(df_team):
     formating_dict = {
         "xG": "{:.2f}",
@@ -554,77 +743,273 @@ def make_croqueurs_killers(df_team):
     return df_killers, df_croqueurs
 
 
-def make_match_dict(match: str) -> dict:
-    """Converts raw html of match boxes to dict"""
-    date = match.find("div", {"class": "calendar-date"}).text
-    opponent = match.find("div", {"class": "team-title"}).text
-    goals = match.find("div", {"class": "teams-xG"}).text
-    home_goals = goals[:4]
-    away_goals = goals[4:]
-
-    tag_results = str(match.find("div", {"class": "calendar-date"}))
-    match_result = re.findall(r"data-result=(.{3})", tag_results)[0][1]
-    team_side = re.findall(r"data-side=(.{3})", tag_results)[0][1]
-
-    match_dict = {
-        "date": date,
-        "opponent": opponent,
-        "team_side": team_side,
-        "match_result": match_result,
-        "home_xGoals": float(home_goals),
-        "away_xGoals": float(away_goals),
-    }
+def get_rolling_column(side: str, window: int = None, halflife: int = None) -> str:
+    """Name of the rolling xG column of `side` ('team' or 'opponent'): mean over
+    `window` matches, or exponentially weighted with `halflife` if given"""
+    if halflife is not None:
+        return f"ewm_{side}_xG_{halflife}"
+    return f"rolling_{side}_xG_{window}"
+
+
+def get_rolling_means(
+    values: np.ndarray, position: np.ndarray, windows: Tuple, halflives: Tuple
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Rolling means of the columns of `values` (matches x columns) over each of
+    `windows` matches, shape (matches, windows, columns), and exponentially
+    weighted with each of `halflives` (as pandas' ewm(halflife=...)), shape
+    (matches, halflives, columns). position is the index of each match in its
+    group (season), whose rows must be contiguous. All of them come from one
+    cumulative sum; means of less than 2 matches are NaN"""
+    index = np.arange(len(values))
+
+    def get_cumsum(array: np.ndarray) -> np.ndarray:
+        """Cumulative sum of the rows, starting at 0: rows [i, j[ sum to
+        cumsum[j] - cumsum[i]"""
+        return np.concatenate([np.zeros_like(array[:1]), np.cumsum(array, axis=0)])
+
+    # the last `window` matches, or less at the start of the group
+    counts = np.minimum(position[:, None] + 1, np.asarray(windows)[None, :])
+    cumsum = get_cumsum(values)
+    rolling = cumsum[index + 1, None] - cumsum[index[:, None] + 1 - counts]
+    rolling /= counts[..., None]
+    rolling[counts < 2] = np.nan
+
+    # sum of decay^(t - j) x_j = decay^t * sum of decay^-j x_j, over the matches j
+    # of the group so far: decay^t cancels out in the weighted mean (j counted
+    # from the start of the group, at most a season: no overflow)
+    decays = 0.5 ** (1 / np.asarray(halflives, dtype=float))
+    weights = decays[None, :] ** -position[:, None].astype(float)
+    starts = index - position
+    weighted_cumsum = get_cumsum(weights[..., None] * values[:, None])
+    weights_cumsum = get_cumsum(weights)
+    ewm = weighted_cumsum[index + 1] - weighted_cumsum[starts]
+    ewm /= (weights_cumsum[index + 1] - weights_cumsum[starts])[..., None]
+    ewm[position < 1] = np.nan
+
+    return rolling, ewm
+
+
+@memoize
+def process_df_teams(
+    df_team: pd.DataFrame,
+    windows: Tuple = config.ROLLING_WINDOWS,
+    halflives: Tuple = config.EWMA_HALF_LIVES,
+    by: str = None,
+):
+    """Create team xG columns from home/away xG and adds the rolling xG over
+    each of `windows` matches and exponentially weighted with each of
+    `halflives` (see get_rolling_column), per `by` group (e.g. 'season', whose
+    rows are contiguous) if given"""
+    with metrics.span("transform", step="process_df_teams"):
+        goals_if_home = (df_team["team_side"] == "h") * df_team["home_xGoals"]
+        goals_if_away = (df_team["team_side"] == "a") * df_team["away_xGoals"]
+
+        df_team["team_xGoals"] = goals_if_home + goals_if_away
+        df_team["opponents_xGoals"] = (
+            df_team["home_xGoals"] +
+            df_team["away_xGoals"] - df_team["team_xGoals"]
+        )
 
-    return match_dict
+        df_team = df_team.reset_index()
+        # matchday: place in the calendar, postponed matches keeping theirs
+        df_team["journée"] = df_team["position"] + 1
+
+        # the rolling means follow the order of the played matches
+        groups = df_team.groupby(df_team[by] if by else np.zeros(len(df_team)))
+        rolling, ewm = get_rolling_means(
+            df_team[["team_xGoals", "opponents_xGoals"]].to_numpy(dtype=float),
+            groups.cumcount().to_numpy(),
+            windows,
+            halflives,
+        )
+        for k, side in enumerate(["team", "opponent"]):
+            for j, window in enumerate(windows):
+                df_team[get_rolling_column(side, window=window)] = rolling[:, j, k]
+            for j, halflife in enumerate(halflives):
+                df_team[get_rolling_column(side, halflife=halflife)] = ewm[:, j, k]
 
+        side_mapper = {"h": "Domicile", "a": "Extérieur"}
+        result_mapper = {"w": "Victoire", "d": "Match Nul", "l": "Défaite"}
 
-def process_df_teams(df_team: pd.DataFrame, days_rolling: int):
-    """Create team xG columns from home/away xG
-    and adds rolling xG"""
-    goals_if_home = (df_team["team_side"] == "h") * df_team["home_xGoals"]
-    goals_if_away = (df_team["team_side"] == "a") * df_team["away_xGoals"]
+        df_team["team_side"] = df_team["team_side"].map(side_mapper)
+        df_team["match_result"] = df_team["match_result"].map(result_mapper)
+
+    return df_team
+
+
+@memoize
+def make_matches_df_from_html(table_html: str):
+    """Played matches only, see parsers.parse_calendar for the others"""
+    df_team = pd.DataFrame(parse_calendar(table_html).played)
+    df_team = process_df_teams(df_team)
+
+    return df_team
 
-    df_team["team_xGoals"] = goals_if_home + goals_if_away
-    df_team["opponents_xGoals"] = (
-        df_team["home_xGoals"] +
-        df_team["away_xGoals"] - df_team["team_xGoals"]
-    )
 
-    df_team = df_team.reset_index()
-    df_team["journée"] = df_team["index"] + 1
-    df_team["rolling_team_xG"] = (
-        df_team["team_xGoals"].rolling(days_rolling, min_periods=2).mean()
+def get_team_seasons(team_name: str, years: List[int]) -> pd.DataFrame:
+    """Played matches of a team over all its cached seasons among `years`,
+    see make_seasons_df"""
+    versions = {year: STORE.version(team_name, year, "matches") for year in years}
+    versions = tuple((year, v) for year, v in versions.items() if v is not None)
+
+    return _load_team_seasons(team_name, versions)
+
+
+@memoize
+def _load_team_seasons(team_name: str, versions: Tuple) -> pd.DataFrame:
+    """versions ((year, version) of each calendar) is only
+    part of the memoization key: changed calendars are read again"""
+    return parsed_cache.get_parsed_table(
+        f"{team_name}_seasons_matches",
+        repr(versions).encode(),
+        lambda: STORE.read_seasons(
+            team_name, [year for year, _ in versions], "matches"),
+        make_seasons_df,
     )
 
-    df_team["rolling_opponent_xG"] = (
-        df_team["opponents_xGoals"].rolling(days_rolling, min_periods=2).mean()
+
+def make_seasons_df(calendars: Dict[int, str]) -> pd.DataFrame:
+    """Played matches of several seasons {year: calendar html} in one
+    DataFrame with a 'season' column, team and rolling xG of all seasons
+    being computed at once"""
+    seasons = [parse_calendar(calendars[year]).played for year in sorted(calendars)]
+
+    df_seasons = pd.DataFrame(
+        {
+            col: np.concatenate([season[col] for season in seasons])
+            for col in CALENDAR_COLUMNS
+        }
+        if seasons
+        else {col: [] for col in CALENDAR_COLUMNS}
+    )
+    df_seasons.insert(
+        0,
+        "season",
+        np.repeat(sorted(calendars), [len(season["match_id"]) for season in seasons]),
     )
 
-    side_mapper = {"h": "Domicile", "a": "Extérieur"}
-    result_mapper = {"w": "Victoire", "d": "Match Nul", "l": "Défaite"}
+    return process_df_teams(df_seasons, by="season")
+
+
+def plot_team_trajectory(df_seasons: pd.DataFrame, team_name: str):
+    """Rolling xG produced and conceded over several seasons, one line
+    per season"""
+    seasons = sorted(df_seasons["season"].unique())
+    palette = viridis(max(len(seasons), 1))
+
+    figures = []
+    window = config.DEFAULT_ROLLING_WINDOW
+    for rolling_col, title in [
+        (get_rolling_column("team", window), f"xG produits par {team_name}"),
+        (get_rolling_column("opponent", window), f"xG concédés par {team_name}"),
+    ]:
+        fig = figure(
+            title=f"{title} (moyenne glissante sur {window} matchs)",
+            plot_width=900,
+            plot_height=400,
+            x_range=figures[0].x_range if figures else None,
+        )
+
+        for season, color in zip(seasons, palette):
+            fig.line(
+                x="journée",
+                y=rolling_col,
+                source=df_seasons[df_seasons["season"] == season],
+                color=color,
+                legend_label=f"{season}-{season + 1}",
+                line_width=2,
+            )
+
+        hover = HoverTool()
+        hover.tooltips = [
+            ("Saison", "@season"),
+            ("Journée", "@journée"),
+            ("xG (moyenne)", f"@{rolling_col}{{0.2f}}"),
+            ("Adversaire", "@opponent"),
+        ]
+        fig.add_tools(hover)
 
-    df_team["team_side"] = df_team["team_side"].map(side_mapper)
-    df_team["match_result"] = df_team["match_result"].map(result_mapper)
+        if seasons:
+            fig.legend.click_policy = "hide"
+            fig.legend.location = "top_left"
+        fig.toolbar.logo = None
+        fig.toolbar_location = None
 
-    return df_team
+        fig.xaxis.axis_label = "Journée"
+        fig.yaxis.axis_label = "xGoals par match"
+        fig.xaxis.major_label_text_font_size = "12pt"
+        fig.yaxis.major_label_text_font_size = "12pt"
+        fig.background_fill_color = "gray"
+        fig.background_fill_alpha = 0.05
 
+        figures.append(fig)
 
-def make_matches_df_from_html(table_html: str):
-    list_matches = BeautifulSoup(table_html).find_all(
-        "div", {"class": "calendar-date-container mini"}
+    return column(*figures)
+
+
+def plot_player_career(df_career: pd.DataFrame, player: str) -> Figure:
+    """Goals vs xG and assists vs xA of a player, one point per season and
+    team"""
+    df_career = df_career.assign(
+        season=[
+            f"{year}-{year + 1} {team.replace('_', ' ')}"
+            for year, team in zip(df_career["year"], df_career["team"])
+        ]
     )
+    source = ColumnDataSource(df_career)
 
-    match_info = dict()
-    for j, match in enumerate(list_matches):
-        try:
-            match_info[j] = make_match_dict(match)
-        except AttributeError:  # match not played yet
-            pass
+    fig = figure(
+        title=f"Carrière de {player} : réel vs attendu par saison",
+        x_range=list(df_career["season"]),
+        plot_width=900,
+        plot_height=450,
+    )
 
-    df_team = pd.DataFrame.from_dict(match_info).T
-    df_team = process_df_teams(df_team, days_rolling=6)
+    for column_name, label, color, dash in [
+        ("G", "Buts", "firebrick", "solid"),
+        ("xG", "xG", "firebrick", "dashed"),
+        ("A", "Assists", "navy", "solid"),
+        ("xA", "xA", "navy", "dashed"),
+    ]:
+        fig.line(
+            x="season",
+            y=column_name,
+            source=source,
+            color=color,
+            line_dash=dash,
+            line_width=2,
+            legend_label=label,
+        )
+        fig.circle(
+            x="season",
+            y=column_name,
+            source=source,
+            color=color,
+            size=7,
+            legend_label=label,
+        )
 
-    return df_team
+    hover = HoverTool()
+    hover.tooltips = [
+        ("Saison", "@season"),
+        ("Minutes", "@minutes"),
+        ("Buts / xG", "@G / @xG{0.2f}"),
+        ("Assists / xA", "@A / @xA{0.2f}"),
+    ]
+    fig.add_tools(hover)
+
+    fig.legend.click_policy = "hide"
+    fig.legend.location = "top_left"
+    fig.toolbar.logo = None
+    fig.toolbar_location = None
+
+    fig.xaxis.major_label_orientation = np.pi / 4
+    fig.yaxis.axis_label = "Nombre sur la saison"
+    fig.yaxis.major_label_text_font_size = "12pt"
+    fig.background_fill_color = "gray"
+    fig.background_fill_alpha = 0.05
+
+    return fig
 
 
 def plot_xG_team_df(
@@ -633,7 +1018,12 @@ def plot_xG_team_df(
     year: int,
     rolling_xG: bool,
     rolling_xGA: bool,
+    windows: Tuple = (config.DEFAULT_ROLLING_WINDOW,),
+    halflife: int = None,
 ) -> Figure:
+    """xG of each match, with the rolling xG produced (rolling_xG) and conceded
+    (rolling_xGA) over each of `windows` matches, and exponentially weighted
+    with `halflife` if given"""
     team_max_xG = df_team["team_xGoals"].max() + 0.5
 
     fig = figure(
@@ -658,25 +1048,34 @@ def plot_xG_team_df(
         color={"field": "match_result", "transform": color_mapper},
     )
 
-    if rolling_xG:
-        fig.line(
-            x="journée",
-            y="rolling_team_xG",
-            source=df_team,
-            color="green",
-            legend_label="Moyenne glissante de xG produits (6 matchs)",
-            line_width=1.5,
-        )
-
-    if rolling_xGA:
-        fig.line(
-            x="journée",
-            y="rolling_opponent_xG",
-            source=df_team,
-            color="red",
-            legend_label="Moyenne glissante de xG concédés (6 matchs)",
-            line_width=1.5,
-        )
+    for side, label, color, shown in [
+        ("team", "produits", "green", rolling_xG),
+        ("opponent", "concédés", "red", rolling_xGA),
+    ]:
+        if not shown:
+            continue
+        dashes = itertools.cycle(["solid", "dashed", "dotted"])
+        for window, dash in zip(windows, dashes):
+            fig.line(
+                x="journée",
+                y=get_rolling_column(side, window=window),
+                source=df_team,
+                color=color,
+                line_dash=dash,
+                legend_label=f"Moyenne glissante de xG {label} ({window} matchs)",
+                line_width=1.5,
+            )
+        if halflife is not None:
+            fig.line(
+                x="journée",
+                y=get_rolling_column(side, halflife=halflife),
+                source=df_team,
+                color=color,
+                line_alpha=0.6,
+                legend_label=f"Moyenne exponentielle de xG {label} "
+                f"(demi-vie {halflife} matchs)",
+                line_width=3,
+            )
 
     glyph = r.glyph
     glyph.size = 15
@@ -686,13 +1085,14 @@ def plot_xG_team_df(
 
     hover = HoverTool()
     hover.tooltips = [
-        ("Date", "@date"),
+        ("Date", "@date{%d/%m/%Y}"),
         ("xG", "@team_xGoals{0.2f}"),
         ("xG contre", "@opponents_xGoals{0.2f}"),
         ("Opponent", "@opponent"),
         ("Lieu", "@team_side"),
         ("Résultat", "@match_result"),
     ]
+    hover.formatters = {"@date": "datetime"}
     fig.add_tools(hover)
 
     fig.toolbar.logo = None
@@ -709,3 +1109,11 @@ def plot_xG_team_df(
     fig.background_fill_alpha = 0.05
 
     return fig
+
+
+PARSERS = {
+    "players": process_html,
+    "statistics": lambda html_table: process_html(html_table, mode="GA"),
+    "league": process_html_league,
+    "matches": make_matches_df_from_html,
+}
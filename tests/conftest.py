@@ -0,0 +1,18 @@
+"""
+The tests run on a throwaway cache store, filled lazily from data_cache/tables.zip
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+os.environ["XG_TRACKER_DB_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="xg_tracker_tests_"), "xg_tracker.sqlite"
+)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+# pylint:disable=wrong-import-position
+import config  # noqa: E402
+
+config.ARCHIVE_PATH = os.path.join(ROOT, "data_cache", "tables.zip")
@@ -0,0 +1,100 @@
+"""
+Failure handling of the asyncio refresh, against the fixture server
+"""
+import random
+
+import pytest
+
+import config
+import metrics
+from async_fetch import update_db_async
+from cache_store import STORE
+from fixture_server import Faults, start_fixture_server
+
+TEAM, YEAR = "Lille", 2019
+
+
+@pytest.fixture(autouse=True)
+def fast_refresh(monkeypatch):
+    monkeypatch.setattr(config, "REFRESH_RATE", 1e6)
+    monkeypatch.setattr(config, "REFRESH_BURST", 1e6)
+    monkeypatch.setattr(config, "HTTP_BACKOFF", 0.01)
+    monkeypatch.setattr(config, "HTTP_TIMEOUT", 0.5)
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Starts a fixture server with the given faults, as config.UNDERSTAT_URL"""
+    servers = []
+
+    def start(faults: Faults, draws: list = None):
+        if draws is not None:  # the fault drawn for each request, in order
+            draws = iter(draws)
+            monkeypatch.setattr(random, "random", lambda: next(draws))
+        server = start_fixture_server(faults=faults)
+        servers.append(server)
+        monkeypatch.setattr(
+            config, "UNDERSTAT_URL", f"http://localhost:{server.server_port}"
+        )
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def get_retries(reason: str) -> float:
+    return metrics._counters.get(  # pylint:disable=protected-access
+        ("fetch_retries", (("reason", reason),)), 0
+    )
+
+
+def refresh(**kwargs) -> dict:
+    return update_db_async([TEAM], [YEAR], "team", force=True, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "faults, reason",
+    [
+        (Faults(throttle_rate=0.5, retry_after=0.01), "429"),
+        (Faults(error_rate=0.5), "503"),
+        (Faults(timeout_rate=0.5, hang=1), "TimeoutError"),
+    ],
+)
+def test_failed_requests_are_retried(serve, faults, reason):
+    serve(faults, draws=[0.0, 0.0, 0.99])  # two failures, then the page
+    retries = get_retries(reason)
+    fetched_at = STORE.fetched_at(TEAM, YEAR, "matches")
+
+    assert refresh() == dict()
+    assert get_retries(reason) - retries == 2
+    assert STORE.fetched_at(TEAM, YEAR, "matches") > fetched_at
+
+
+def test_gives_up_after_the_retries(serve, monkeypatch):
+    monkeypatch.setattr(config, "HTTP_RETRIES", 2)
+    serve(Faults(throttle_rate=1, retry_after=0.01))
+
+    errors = refresh()
+
+    assert list(errors) == [(TEAM, YEAR)]
+    assert "FetchError" in errors[(TEAM, YEAR)]
+    assert "failed 3 times, last: 429" in errors[(TEAM, YEAR)]
+
+
+def test_malformed_page_is_not_saved(serve):
+    serve(Faults(malformed_rate=1))
+    fetched_at = STORE.fetched_at(TEAM, YEAR, "matches")
+
+    errors = refresh()
+
+    assert errors[(TEAM, YEAR)].startswith("ValueError")
+    assert STORE.fetched_at(TEAM, YEAR, "matches") == fetched_at
+
+
+def test_deadline_cancels_the_pending_pages(serve):
+    serve(Faults(delay=0.3))
+
+    teams = [TEAM, "Lyon", "Marseille"]
+    errors = update_db_async(teams, [YEAR], "team", force=True, deadline=0.1)
+
+    assert errors == {(team, YEAR): "cancelled" for team in teams}